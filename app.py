@@ -1,5 +1,103 @@
-from test_case import *
-import asyncio
+import time
 
+started = time.perf_counter()
 
-asyncio.run(main())
+from config import event_loop
+import argparse
+import importlib
+
+
+# The suites that can be run by name, any other module.Class path can be given
+# as well. Nothing is imported for --help and --list, but all of these live in
+# test_case, so running any one of them imports all of them along with
+# vehicle_client and tornado, which take almost all of the import time.
+SUITES = {'route': 'test_case.RouteTest',
+          'driver': 'test_case.DriverTest',
+          'device': 'test_case.DeviceTest',
+          'program': 'test_case.ProgramTest',
+          'vehicle': 'test_case.VehicleTest',
+          'event': 'test_case.EventTest',
+          'telematic': 'test_case.TelematicTest',
+          'realtime': 'test_case.RealtimeTest'}
+DEFAULT_SUITES = ('event', 'telematic', 'realtime')
+
+
+def load_suite(path):
+    module, _, name = path.rpartition('.')
+    if not module:
+        raise ValueError(f'Unknown suite {path!r}, expected one of {", ".join(SUITES)} or module.Class.')
+    return getattr(importlib.import_module(module), name)
+
+
+def run_sharded(paths, processes, loop):
+    from shard import run_sharded
+    from config import report_jsonl, report_junit
+
+    reporter, metrics = run_sharded(paths, processes, loop)
+    metrics.print_report()
+    if report_jsonl is not None:
+        reporter.write_jsonl(report_jsonl)
+    if report_junit is not None:
+        reporter.write_junit(report_junit)
+    reporter.print_summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the test suites of the vehicle APIs.')
+    parser.add_argument('suites', nargs='*', default=list(DEFAULT_SUITES),
+                        help=f'suites to run, any of {", ".join(SUITES)} or module.Class, '
+                             f'default {" ".join(DEFAULT_SUITES)}')
+    parser.add_argument('--loop', choices=('auto', 'uvloop', 'asyncio'), default=event_loop,
+                        help='event loop, auto uses uvloop when it is installed')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='processes to split the suites across, each with its own event loop')
+    parser.add_argument('--monitor', action='store_true',
+                        help='measure the event loop lag, slow callbacks and the time spent waiting on the network')
+    parser.add_argument('--profile', choices=('cprofile', 'sample'),
+                        help='profile every suite on its own, implies --monitor')
+    parser.add_argument('--list', action='store_true', help='print the suites that can be run by name')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, path in SUITES.items():
+            print(f'{name:<10} {path}')
+        return
+
+    from event_loop import install, run
+
+    try:
+        loop = install(args.loop)
+    except RuntimeError as e:
+        parser.error(str(e))
+    paths = [SUITES.get(name, name) for name in args.suites]
+    if args.processes > 1 and (args.monitor or args.profile):
+        parser.error('--monitor and --profile measure a single process, leave out --processes')
+
+    # The suites are loaded here even when they run in other processes, so a
+    # wrong name is an error of the command line rather than of a worker.
+    imported = time.perf_counter()
+    try:
+        suites = [load_suite(path) for path in paths]
+    except (ValueError, ImportError, AttributeError) as e:
+        parser.error(str(e))
+    ready = time.perf_counter()
+    print(f'Started in {(ready - started) * 1000:.1f} ms '
+          f'({(ready - imported) * 1000:.1f} ms importing the suites), {loop} event loop')
+    if args.processes > 1:
+        run_sharded(paths, args.processes, args.loop)
+        return
+
+    test_case = importlib.import_module('test_case')
+    monitor = None
+    if args.monitor or args.profile:
+        from profiling import LoopMonitor
+
+        monitor = LoopMonitor(profile=args.profile)
+    _, overhead = run(test_case.main, suites, monitor)
+    print(f'Event loop started and closed in {overhead * 1000:.1f} ms')
+    if monitor is not None and monitor.profilers:
+        print(f"Saved the profiles to {', '.join(monitor.save_profiles())}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+
+class BatchResult:
+    """The outcome of running one operation over many items."""
+
+    def __init__(self, items):
+        self.items = items
+        self.results = [None] * len(items)
+        self.failures = []
+        self.done = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def elapsed(self)->float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def succeeded(self)->int:
+        return self.done - len(self.failures)
+
+    @property
+    def rate(self)->float:
+        """Finished operations per second."""
+
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+
+def response_error(response):
+    """A `check` for operations that return an HTTP response."""
+
+    if response is None:
+        return 'no response'
+    if response.error:
+        return f'{response.code} {response.error}'
+
+
+async def run_batch(operation, items, concurrency, check=None, progress=None)->BatchResult:
+    """Await `operation(item)` for every item with at most `concurrency` in flight.
+
+    `check(result)` returns an error message when a call did not succeed, and
+    an exception raised by a call is recorded the same way, so one bad item
+    never stops the batch. `progress(batch)` is called after every item.
+    Results keep the order of `items`.
+    """
+
+    items = list(items)
+    batch = BatchResult(items)
+    indexes = iter(range(len(items)))
+
+    async def worker():
+        for index in indexes:
+            item = items[index]
+            try:
+                result = await operation(item)
+                error = check(result) if check is not None else None
+            except Exception as e:
+                result, error = None, str(e)
+            batch.results[index] = result
+            if error is not None:
+                batch.failures.append((item, error))
+            batch.done += 1
+            if progress is not None:
+                progress(batch)
+
+    workers = min(concurrency, len(items))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    batch.finished = time.monotonic()
+    return batch
@@ -0,0 +1,234 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from fake_server import FakeServiceProcess
+from vehicle_client import VehicleClient
+from metrics import LatencyHistogram
+from batch import run_batch
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import tornado
+
+try:
+    import resource
+except ImportError:
+    # Windows has no resource module, peak RSS is then not reported.
+    resource = None
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+class Bench:
+    """What a scenario measures: the operations it timed and their latencies."""
+
+    def __init__(self, service):
+        self.service = service
+        self.latencies = LatencyHistogram()
+        self.ops = 0
+        self.extra = {}
+        self.started = time.perf_counter()
+
+    def start(self):
+        """Start the clock once the scenario is set up."""
+
+        self.started = time.perf_counter()
+
+    async def timed(self, awaitable):
+        started = time.perf_counter()
+        result = await awaitable
+        self.latencies.record(time.perf_counter() - started)
+        self.ops += 1
+        return result
+
+
+async def get_client()->VehicleClient:
+    client = VehicleClient()
+    await client.refresh_token()
+    return client
+
+
+@scenario('single_call')
+async def single_call(bench):
+    client = await get_client()
+    bench.start()
+    for _ in range(500):
+        await bench.timed(client.get_device_list())
+
+
+async def list_decode(bench, size, repeat):
+    from test_case import RouteTest
+
+    await bench.service.seed('route', size)
+    suite = RouteTest()
+    await suite.client.refresh_token()
+    bench.start()
+    for _ in range(repeat):
+        await bench.timed(suite._get_route_list())
+
+
+@scenario('list_decode_1k')
+async def list_decode_1k(bench):
+    await list_decode(bench, 1000, 100)
+
+
+@scenario('list_decode_10k')
+async def list_decode_10k(bench):
+    await list_decode(bench, 10000, 20)
+
+
+@scenario('stream_10k')
+async def stream_10k(bench):
+    await bench.service.seed('route', 10000)
+    client = await get_client()
+
+    async def count():
+        return len([item async for item in client.stream_route_list()])
+
+    bench.start()
+    for _ in range(20):
+        await bench.timed(count())
+
+
+@scenario('concurrent_crud')
+async def concurrent_crud(bench):
+    from test_case import RouteTest
+
+    suite = RouteTest()
+    await suite.client.refresh_token()
+
+    async def cycle(_):
+        id = await suite._post_route()
+        await suite.client.put_route(id, suite.get_random_name())
+        await suite._get_route_list(id)
+        await suite.client.delete_route(id)
+
+    bench.start()
+    await run_batch(lambda i: bench.timed(cycle(i)), range(500), 20)
+
+
+@scenario('bulk_post_1k')
+async def bulk_post_1k(bench):
+    client = await get_client()
+    bench.start()
+    batch = await client.bulk_post_route([f'bench {index}' for index in range(1000)])
+    bench.latencies = client.metrics.latencies['POST route']
+    bench.ops = batch.succeeded
+
+
+@scenario('cleanup_5k')
+async def cleanup_5k(bench):
+    from test_case import RouteTest
+
+    await bench.service.seed('route', 5000)
+    suite = RouteTest()
+    await suite.client.refresh_token()
+    bench.start()
+    await suite.clear()
+    bench.latencies = suite.client.metrics.latencies['DELETE route']
+    bench.ops = bench.latencies.count
+
+
+@scenario('token_refresh_storm')
+async def token_refresh_storm(bench):
+    client = await get_client()
+    await bench.service.expire_tokens()
+    bench.start()
+    await asyncio.gather(*(bench.timed(client.get_device_list()) for _ in range(500)))
+    bench.extra['auth_requests'] = client.metrics.latencies['POST auth/token'].count - 1
+
+
+def get_revision()->str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                        cwd=os.path.dirname(os.path.abspath(__file__)),
+                                        stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+async def run_scenario(name, latency)->dict:
+    logging.getLogger('tornado.access').disabled = True
+    # The service runs in a process of its own, so only the client is measured.
+    service = FakeServiceProcess(['--latency', str(latency), '--seed', '0'])
+    service.start()
+    service.use()
+    bench = Bench(service)
+    try:
+        with redirect_stdout(io.StringIO()):
+            await SCENARIOS[name](bench)
+        seconds = time.perf_counter() - bench.started
+    finally:
+        service.stop()
+    latencies = bench.latencies.summary()
+    return dict({'scenario': name,
+                 'ops': bench.ops,
+                 'seconds': seconds,
+                 'ops_per_sec': bench.ops / seconds if seconds else 0.0,
+                 'p50_ms': latencies['p50_ms'],
+                 'p99_ms': latencies['p99_ms'],
+                 'peak_rss_kb': get_peak_rss_kb(),
+                 'server_latency': latency},
+                **bench.extra)
+
+
+def get_peak_rss_kb()->int:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes.
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_in_process(name, latency)->dict:
+    return asyncio.run(run_scenario(name, latency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark VehicleClient and the suites against fake_server.')
+    parser.add_argument('scenarios', nargs='*', default=list(SCENARIOS),
+                        help=f'scenarios to run, default all of: {", ".join(SCENARIOS)}')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the fake server adds per request')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--output', help='append the results as JSON lines to this file')
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+
+    common = {'revision': get_revision(),
+              'python': platform.python_version(),
+              'tornado': tornado.version,
+              'timestamp': int(time.time())}
+    output = open(args.output, 'a') if args.output else None
+    try:
+        for _ in range(args.repeat):
+            for name in args.scenarios:
+                # A fresh process per scenario keeps peak RSS and warm caches apart.
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    result = executor.submit(run_in_process, name, args.latency).result()
+                line = json.dumps(dict(result, **common))
+                print(line)
+                if output is not None:
+                    output.write(line + '\n')
+    finally:
+        if output is not None:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
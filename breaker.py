@@ -0,0 +1,126 @@
+from config import breaker_failure_rate, breaker_window, breaker_min_calls, breaker_cooldown
+from config import breaker_consecutive_failures
+from reporter import log
+from collections import deque
+import time
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of sending a request to an endpoint whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Stop calling one endpoint while it keeps failing.
+
+    The circuit is closed while it works. It opens when at least
+    `failure_rate` of the last `window` calls failed, once there were
+    `min_calls` of them, or after `consecutive` failures in a row when that
+    is set, and calls are then rejected without being sent.
+    After `cooldown` seconds it is half-open: one probe call goes through,
+    and the circuit closes if it succeeds or opens again if it fails.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name, failure_rate=breaker_failure_rate, window=breaker_window,
+                 min_calls=breaker_min_calls, cooldown=breaker_cooldown, consecutive=None, on_change=None):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.consecutive = consecutive
+        self.failures_in_row = 0
+        self.cooldown = cooldown
+        self.on_change = on_change
+        self.outcomes = deque(maxlen=window)
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.probing = False
+        self.rejected = 0
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may be sent now."""
+
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self._change(self.HALF_OPEN)
+        if self.state == self.OPEN or (self.state == self.HALF_OPEN and self.probing):
+            self.rejected += 1
+            raise CircuitOpenError(f'The circuit of {self.name} is {self.state}.')
+        if self.state == self.HALF_OPEN:
+            self.probing = True
+
+    def record(self, failed):
+        if self.state == self.HALF_OPEN:
+            self.probing = False
+            self._change(self.OPEN if failed else self.CLOSED)
+            return
+        self.outcomes.append(failed)
+        self.failures_in_row = self.failures_in_row + 1 if failed else 0
+        if self.state != self.CLOSED:
+            return
+        if ((len(self.outcomes) >= self.min_calls and sum(self.outcomes) >= self.failure_rate * len(self.outcomes))
+                or (self.consecutive is not None and self.failures_in_row >= self.consecutive)):
+            self._change(self.OPEN)
+
+    def cancelled(self):
+        """Forget a call that got no response, because it was cancelled or failed in this process."""
+
+        if self.state == self.HALF_OPEN:
+            self.probing = False
+
+    def _change(self, state):
+        previous, self.state = self.state, state
+        if state == self.OPEN:
+            self.opened_at = time.monotonic()
+        self.outcomes.clear()
+        self.failures_in_row = 0
+        if self.on_change is not None:
+            self.on_change(self, previous, state)
+
+
+class CircuitBreakers:
+    """One CircuitBreaker per endpoint, e.g. 'GET route/list', and per host, and the log of their state changes.
+
+    The circuit of a host also opens after `consecutive` failures in a row
+    of any of its endpoints, so a service that is down fails fast after a
+    few calls instead of after min_calls calls to every endpoint.
+    """
+
+    def __init__(self, consecutive=breaker_consecutive_failures, **options):
+        self.consecutive = consecutive
+        self.options = options
+        self.breakers = {}
+        self.changes = []
+
+    def get(self, endpoint, **options)->CircuitBreaker:
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            options = dict(self.options, **options)
+            breaker = self.breakers[endpoint] = CircuitBreaker(endpoint, on_change=self.changed, **options)
+        return breaker
+
+    def host(self, host)->CircuitBreaker:
+        return self.get(host, consecutive=self.consecutive)
+
+    @staticmethod
+    def before_call(breakers):
+        """Call before_call() of every breaker, and let go of the ones that passed if one raises."""
+
+        passed = []
+        try:
+            for breaker in breakers:
+                breaker.before_call()
+                passed.append(breaker)
+        except CircuitOpenError:
+            for breaker in passed:
+                breaker.cancelled()
+            raise
+
+    def changed(self, breaker, previous, state):
+        self.changes.append((time.time(), breaker.name, previous, state))
+        log(f'Circuit of {breaker.name}: {previous} -> {state}')
+
+    def stats(self)->dict:
+        return {endpoint: {'state': breaker.state, 'rejected': breaker.rejected}
+                for endpoint, breaker in sorted(self.breakers.items())}
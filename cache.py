@@ -0,0 +1,90 @@
+from config import response_cache_ttl, response_cache_size
+from collections import OrderedDict
+import time
+
+
+# The resource a GET path reads, and the resources a write to a path changes.
+READS = {'route': 'route',
+         'route/list': 'route',
+         'driver': 'driver',
+         'driver/list': 'driver',
+         'program': 'program',
+         'program/list': 'program',
+         'program/search': 'program',
+         'list': 'item',
+         'list/by_device': 'item',
+         'device/list': 'device'}
+
+WRITES = {'route': ('route',),
+          'driver': ('driver',),
+          'program': ('program', 'item'),
+          'program/link': ('program', 'item'),
+          'item': ('item', 'device')}
+
+
+class ResponseCache:
+    """A cache of GET responses keyed by URL, bounded by a TTL and an LRU size.
+
+    A write to a resource drops every cached response that reads it, and
+    bumps a generation number so a GET that was already in flight during
+    the write does not store what it read.
+    """
+
+    def __init__(self, ttl=response_cache_ttl, max_entries=response_cache_size):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.urls = {}
+        self.generations = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, url, path):
+        entry = self.entries.get(url)
+        if entry is not None:
+            expires_at, resource, response = entry
+            if expires_at > time.monotonic():
+                self.entries.move_to_end(url)
+                self.hits += 1
+                return response
+            self._remove(url)
+        self.misses += 1
+        return None
+
+    def generation(self, path)->int:
+        return self.generations.get(READS.get(path, path), 0)
+
+    def put(self, url, path, response, generation):
+        """Store a response, unless its resource was written since `generation` was read."""
+
+        resource = READS.get(path, path)
+        if self.generations.get(resource, 0) != generation:
+            return
+        if url in self.entries:
+            self._remove(url)
+        self.entries[url] = (time.monotonic() + self.ttl, resource, response)
+        self.urls.setdefault(resource, set()).add(url)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+
+    def invalidate(self, path):
+        """Drop the responses of every resource a write to `path` changes."""
+
+        for resource in WRITES.get(path, (READS.get(path, path),)):
+            self.generations[resource] = self.generations.get(resource, 0) + 1
+            for url in self.urls.pop(resource, ()):
+                self.entries.pop(url, None)
+                self.invalidations += 1
+
+    def _remove(self, url):
+        expires_at, resource, response = self.entries.pop(url)
+        self.urls[resource].discard(url)
+
+    def stats(self)->dict:
+        lookups = self.hits + self.misses
+        return {'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations}
@@ -0,0 +1,290 @@
+from tornado.httpclient import HTTPRequest, HTTPResponse
+from tornado.httputil import HTTPHeaders
+from transport import Transport
+from config import cassette_mode, cassette_path, cassette_latency
+from urllib.parse import urlsplit, parse_qsl, urlencode
+import asyncio
+import config
+import gzip
+import io
+import json
+import re
+import time
+
+
+_UUID = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+_ACCESS_TOKEN = re.compile(r'("access_token"\s*:\s*)"[^"]*"')
+_REDACTED = '"redacted"'
+
+
+def normalize_url(url)->str:
+    """Reduce a URL to its path and sorted query, so the host it was recorded against does not matter."""
+
+    parts = urlsplit(url)
+    return f'{parts.path}?{urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))}'
+
+
+def normalize_body(body)->str:
+    if not body:
+        return ''
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', 'replace')
+    try:
+        return json.dumps(json.loads(body), sort_keys=True, separators=(',', ':'))
+    except ValueError:
+        return body
+
+
+def is_auth(url)->bool:
+    """Whether a normalized URL is the one of auth_entry_point, whose request and response hold credentials."""
+
+    return url == normalize_url(config.auth_entry_point)
+
+
+class Cassette:
+    """Request/response pairs recorded from VehicleClient, stored as gzipped JSON lines.
+
+    An entry is found by method, normalized URL and body. Entries with the
+    same key are replayed in the order they were recorded. When a request
+    only matches once the UUIDs in it are ignored, for example the random
+    names of the suites, every new UUID is bound to the recorded one in its
+    place and the recorded one is swapped back for it in the responses.
+
+    The credentials of the auth call are never written: its body is stored
+    as a placeholder, the access token it answers with as a dummy one, and
+    it is found by method and URL only.
+    """
+
+    def __init__(self, path=cassette_path):
+        self.path = path
+        self.entries = []
+        self.exact = {}
+        self.fuzzy = {}
+        self.aliases = {}
+        self.replaced = {}
+        self.used = set()
+
+    @classmethod
+    def load(cls, path=cassette_path):
+        cassette = cls(path)
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                cassette.add(json.loads(line))
+        return cassette
+
+    def save(self):
+        with gzip.open(self.path, 'wt', encoding='utf-8') as f:
+            for entry in self.entries:
+                if 'code' in entry:
+                    f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+    def add(self, entry):
+        self.entries.append(entry)
+        for index, key in self.keys(entry):
+            index.setdefault(key, []).append(entry)
+
+    def keys(self, entry)->list:
+        key = (entry['method'], entry['url'], _REDACTED if is_auth(entry['url']) else entry['body'])
+        return [(self.exact, key), (self.fuzzy, tuple(_UUID.sub('{uuid}', part) for part in key))]
+
+    def send(self, method, url, body)->dict:
+        """Add the entry of a request when it is sent and return it, for record() to fill in.
+
+        Entries with the same key are replayed in the order they are found,
+        which is the order their requests are sent, not the order their
+        responses happen to complete in.
+        """
+
+        url = normalize_url(url)
+        entry = {'method': method, 'url': url, 'body': _REDACTED if is_auth(url) else normalize_body(body)}
+        self.add(entry)
+        return entry
+
+    def record(self, entry, response, latency, response_body=None):
+        body = (response_body if response_body is not None else response.body or b'').decode('utf-8')
+        if is_auth(entry['url']):
+            body = _ACCESS_TOKEN.sub(r'\1' + _REDACTED, body)
+        entry.update({'code': response.code,
+                      'headers': dict(response.headers or {}),
+                      'response': body,
+                      'latency': latency})
+
+    def discard(self, entry):
+        """Drop the entry of a request that never got a response."""
+
+        # By identity, as the entries of requests still waiting for a response can be equal.
+        for entries in [self.entries] + [index[key] for index, key in self.keys(entry)]:
+            del entries[next(position for position, other in enumerate(entries) if other is entry)]
+
+    def find(self, method, url, body):
+        """Return the next recorded entry for a request and the response body to answer with, or None."""
+
+        url = normalize_url(url)
+        key = (method, url, _REDACTED if is_auth(url) else normalize_body(body))
+        key = tuple(_UUID.sub(lambda match: self.aliases.get(match.group(), match.group()), part)
+                    for part in key)
+        entry = self._next(self.exact.get(key))
+        if entry is None:
+            entry = self._next(self.fuzzy.get(tuple(_UUID.sub('{uuid}', part) for part in key)))
+            if entry is None:
+                return None
+            recorded = _UUID.findall(entry['url'] + entry['body'])
+            for new, old in zip(_UUID.findall(key[1] + key[2]), recorded):
+                if new != old:
+                    self.aliases[new] = old
+                    self.replaced[old] = new
+        self.used.add(id(entry))
+        response = entry['response']
+        if self.replaced:
+            response = _UUID.sub(lambda match: self.replaced.get(match.group(), match.group()), response)
+        return entry, response
+
+    def _next(self, entries):
+        if not entries:
+            return None
+        # Replay in recorded order and keep answering with the last one after that.
+        for entry in entries:
+            if id(entry) not in self.used:
+                return entry
+        return entries[-1]
+
+
+class RecordingTransport:
+    """A Transport that records everything it sends into a Cassette."""
+
+    def __init__(self, cassette, transport=None):
+        self.cassette = cassette
+        self.transport = transport or Transport()
+
+    async def fetch(self, url, **kwargs)->HTTPResponse:
+        chunks = None
+        streaming_callback = kwargs.get('streaming_callback')
+        if streaming_callback is not None:
+            chunks = []
+
+            def recording_callback(chunk):
+                chunks.append(chunk)
+                return streaming_callback(chunk)
+            kwargs['streaming_callback'] = recording_callback
+
+        entry = self.cassette.send(kwargs.get('method', 'GET'), url, kwargs.get('body'))
+        started = time.monotonic()
+        try:
+            response = await self.transport.fetch(url, **kwargs)
+        except BaseException:
+            self.cassette.discard(entry)
+            raise
+        self.cassette.record(entry, response, time.monotonic() - started,
+                             b''.join(chunks) if chunks is not None else None)
+        return response
+
+    def stats(self)->dict:
+        return self.transport.stats()
+
+    def close(self):
+        self.transport.close()
+
+
+class ReplayTransport:
+    """A Transport that answers from a Cassette without touching the network.
+
+    With `latency` every response takes as long as it did when it was
+    recorded, without it responses come back right away.
+    """
+
+    def __init__(self, cassette, latency=cassette_latency):
+        self.cassette = cassette
+        self.latency = latency
+        self.requests = 0
+        self.misses = 0
+
+    async def fetch(self, url, **kwargs)->HTTPResponse:
+        method = kwargs.get('method', 'GET')
+        request = HTTPRequest(url, method=method, headers=kwargs.get('headers'), body=kwargs.get('body'))
+        self.requests += 1
+        found = self.cassette.find(method, url, kwargs.get('body'))
+        if found is None:
+            self.misses += 1
+            return HTTPResponse(request, 599, error=LookupError(f'No recorded response for {method} {url}.'))
+        entry, body = found
+        if self.latency:
+            await asyncio.sleep(entry['latency'])
+        body = body.encode('utf-8')
+
+        streaming_callback = kwargs.get('streaming_callback')
+        if streaming_callback is not None:
+            header_callback = kwargs.get('header_callback')
+            try:
+                if header_callback is not None:
+                    header_callback(f"HTTP/1.1 {entry['code']} Replayed\r\n")
+                streaming_callback(body)
+            except Exception as e:
+                return HTTPResponse(request, 599, error=e)
+            body = b''
+        return HTTPResponse(request, entry['code'],
+                            headers=HTTPHeaders(entry['headers']),
+                            buffer=io.BytesIO(body),
+                            request_time=entry['latency'])
+
+    def stats(self)->dict:
+        return {'backend': 'replay',
+                'max_clients': None,
+                'requests': self.requests,
+                'misses': self.misses,
+                'queued': 0,
+                'active': 0,
+                'peak_queued': 0,
+                'peak_active': 0,
+                'avg_queue_wait': 0.0,
+                'max_queue_wait': 0.0}
+
+    def close(self):
+        pass
+
+
+_recording = None
+_replaying = None
+
+
+def get_transport(mode=cassette_mode, path=cassette_path):
+    """Return the transport for `mode` ('record' or 'replay'), or None for a plain Transport.
+
+    All the transports of one process record into, or replay from, one Cassette.
+    """
+
+    global _recording, _replaying
+    if mode is None:
+        return None
+    if mode == 'record':
+        if _recording is None:
+            _recording = Cassette(path)
+        return RecordingTransport(_recording)
+    if mode == 'replay':
+        if _replaying is None:
+            _replaying = Cassette.load(path)
+        return ReplayTransport(_replaying)
+    raise ValueError(f'Unknown cassette mode {mode!r}.')
+
+
+def save_cassette():
+    """Write what was recorded, if anything was."""
+
+    if _recording is not None:
+        _recording.save()
+
+
+def recorded_entries()->list:
+    """Return the entries recorded in this process, e.g. to hand them to the one that saves them."""
+
+    if _recording is None:
+        return []
+    return [entry for entry in _recording.entries if 'code' in entry]
+
+
+def save_entries(entries, path=cassette_path):
+    """Write entries recorded by other processes to one cassette."""
+
+    cassette = Cassette(path)
+    for entry in entries:
+        cassette.add(entry)
+    cassette.save()
@@ -4,9 +4,120 @@ auth_user = {'domain': 'lileesystems',
 
 auth_entry_point = 'https://service.alpha.lileesystems.com/api/v3/auth/token'
 # auth_entry_point = 'https://service.staging.lileesystems.com/api/v3/auth/token'
+# auth_entry_point = 'http://127.0.0.1:8888/api/v3/auth/token'  # python fake_server.py
 
 # vehicle_entry_point = 'http://192.168.56.102:5001/api/v3/vehicle/'
 vehicle_entry_point = 'http://service.alpha.lileesystems.com/api/v3/vehicle/'
 # vehicle_entry_point = 'http://service.staging.lileesystems.com/api/v3/vehicle/'
+# vehicle_entry_point = 'http://127.0.0.1:8888/api/v3/vehicle/'  # python fake_server.py
 
-telematic_vehicle_id = 'd9144f8d-3e0f-4df6-9a89-92aa7c0d36b8'
\ No newline at end of file
+telematic_vehicle_id = 'd9144f8d-3e0f-4df6-9a89-92aa7c0d36b8'
+
+# Longest time range in seconds requested at once by the chunked telematic and
+# event list methods, and the number of windows requested at the same time.
+telematic_window = 7 * 86400
+event_window = 86400
+window_concurrency = 8
+
+# Realtime polling: the fields requested, the vehicles per request, the requests
+# in flight at the same time and the seconds between two polls.
+realtime_fields = ('vin', 'is_engine_light_on', 'device_status', 'camera_info')
+realtime_batch_size = 100
+realtime_concurrency = 8
+realtime_interval = 5
+
+# Maximum number of tests running at the same time across all suites.
+test_concurrency = 8
+
+# Maximum number of deletes in flight while removing test data.
+cleanup_concurrency = 20
+
+# Maximum number of requests in flight in the bulk methods of VehicleClient.
+bulk_concurrency = 20
+
+# Maximum number of fixtures created at the same time before the tests start.
+fixture_concurrency = 10
+
+# Number of items requested per page when iterating over a list endpoint.
+list_page_size = 500
+
+# Seconds before the token expires at which it is refreshed in the background.
+token_refresh_margin = 60
+
+# Times getting a token is tried, with the backoff of the retries, before the
+# requests waiting for it fail without being sent.
+token_attempts = 3
+
+# HTTP transport of VehicleClient. The 'curl' backend needs pycurl and keeps
+# connections alive between requests; the 'simple' one opens a new connection
+# for every request. Timeouts are in seconds.
+http_backend = 'simple'
+max_clients = 10
+keep_alive = True
+connect_timeout = 20
+request_timeout = 20
+
+# Retries of transient failures by VehicleClient. Only the listed methods are
+# retried, at most retry_max_attempts sends in all, with a jittered exponential
+# backoff in seconds. retry_budget caps the retries at that fraction of requests.
+# A 599 that is a timeout is only retried with retry_timeouts, since every retry
+# of it takes another request_timeout.
+retry_statuses = (429, 502, 503, 504, 599)
+retry_timeouts = False
+retry_methods = ('GET', 'PUT', 'DELETE')
+retry_max_attempts = 3
+retry_base_delay = 0.1
+retry_max_delay = 2.0
+retry_budget = 0.1
+
+# Circuit breaker of every VehicleClient endpoint. A circuit opens when at least
+# breaker_failure_rate of the last breaker_window calls failed with a 5xx or a
+# transport error, once there were breaker_min_calls of them, and rejects calls
+# for breaker_cooldown seconds before it lets a probe call through. The circuit
+# of a whole host also opens after breaker_consecutive_failures failures in a row.
+breaker_failure_rate = 0.5
+breaker_window = 20
+breaker_min_calls = 10
+breaker_cooldown = 10
+breaker_consecutive_failures = 5
+
+# Opt-in hedging of GET requests, used by the suites when hedge_requests is True.
+# A GET slower than the hedge_percentile latency of its endpoint is sent again
+# and the first answer wins. Hedges are capped at hedge_max_extra of the GETs.
+hedge_requests = False
+hedge_percentile = 95
+hedge_max_extra = 0.05
+hedge_min_samples = 20
+
+# Record the traffic of the suites into a cassette file, or replay it from the
+# file without touching the network: cassette_mode is None, 'record' or 'replay'.
+# With cassette_latency a replayed response takes as long as it did recorded.
+cassette_mode = None
+cassette_path = 'vehicle.cassette.gz'
+cassette_latency = True
+
+# Results of the tests: printed to the console as each test finishes when
+# report_console is True, and written as JSON lines and JUnit XML to these
+# paths at the end, unless a path is None.
+report_console = True
+report_jsonl = 'report.jsonl'
+report_junit = 'report.xml'
+
+# Opt-in cache of GET responses, used by the suites when response_cache is True.
+# Entries live for response_cache_ttl seconds, at most response_cache_size of them.
+response_cache = False
+response_cache_ttl = 5
+response_cache_size = 1000
+
+# app.py --monitor samples the lag of the event loop every monitor_interval seconds
+# and flags callbacks running longer than monitor_slow_callback seconds.
+# --profile sample samples the stack every profile_interval seconds, and
+# --profile cprofile saves a profile per suite to profile_path.
+monitor_interval = 0.05
+monitor_slow_callback = 0.05
+profile_interval = 0.005
+profile_path = 'profile-{suite}.prof'
+
+# Event loop of app.py and shard.py: 'auto' uses uvloop when it is installed and
+# the default asyncio loop otherwise, 'uvloop' requires it, 'asyncio' never uses it.
+event_loop = 'auto'
@@ -1,16 +1,17 @@
 from functools import wraps
+from reporter import log, error
 import asyncio
 
 def clear(func):
     @wraps(func)
     async def wrapped(*args):
         try:
-            print('Removing test data...')
+            log('Removing test data...')
             result = await func(*args)
-            print('Finished')
+            log('Finished')
             return result
         except Exception as e:
-            print(f'An error occurred while removing test data. {e}')
+            error(f'An error occurred while removing test data. {e}')
     return wrapped
 
 def exception_handler(func):
@@ -19,6 +20,6 @@ def exception_handler(func):
         try:
             return await func(*args, **kwargs)
         except Exception as e:
-            print(f'An error occurred in VehicleClient.{func.__name__}().', e)
+            error(f'An error occurred in VehicleClient.{func.__name__}(). {e}')
     return wrapped
 
@@ -0,0 +1,38 @@
+from config import event_loop
+import asyncio
+import time
+
+
+def install(name=event_loop)->str:
+    """Make asyncio.run() use the event loop `name` and return the name of the one it will use."""
+
+    if name in ('auto', 'uvloop'):
+        try:
+            import uvloop
+        except ImportError:
+            if name == 'uvloop':
+                raise RuntimeError('The uvloop event loop is not installed, pip install uvloop.')
+            return 'asyncio'
+        uvloop.install()
+        return 'uvloop'
+    if name == 'asyncio':
+        asyncio.set_event_loop_policy(None)
+        return 'asyncio'
+    raise ValueError(f'Unknown event loop {name!r}.')
+
+
+def run(main, *args):
+    """asyncio.run() `main(*args)` and return its result and the seconds spent starting and closing the loop."""
+
+    times = {}
+
+    async def timed():
+        times['entered'] = time.perf_counter()
+        try:
+            return await main(*args)
+        finally:
+            times['left'] = time.perf_counter()
+
+    started = time.perf_counter()
+    result = asyncio.run(timed())
+    return result, times['entered'] - started + time.perf_counter() - times['left']
@@ -0,0 +1,439 @@
+from tornado.httpserver import HTTPServer
+from tornado.httpclient import AsyncHTTPClient
+from tornado.netutil import bind_sockets
+from collections import Counter
+from itertools import islice
+from urllib.parse import urlsplit
+import tornado.web
+import config
+import argparse
+import ast
+import asyncio
+import base64
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+
+
+class FakeHandler(tornado.web.RequestHandler):
+    """Base handler that injects the failures configured on the service."""
+
+    requires_token = True
+
+    def initialize(self, service):
+        self.service = service
+
+    async def prepare(self):
+        service = self.service
+        service.request_count += 1
+        if service.latency:
+            await asyncio.sleep(service.latency)
+        if service.slow_rate and service.random.random() < service.slow_rate:
+            await asyncio.sleep(service.slow_latency)
+        if service.random.random() < service.drop_rate:
+            # Close the connection without an answer, the client sees a 599.
+            self.request.connection.stream.close()
+            self._finished = True
+            return
+        if service.random.random() < service.error_rate:
+            return self.fail(service.error_code, 'Injected error')
+        if self.requires_token:
+            if service.random.random() < service.unauthorized_rate:
+                return self.fail(401, 'Injected unauthorized')
+            if not service.is_valid(self.request.headers.get('Authorization')):
+                return self.fail(401, 'Unauthorized')
+
+    def on_finish(self):
+        self.service.status_counts[self.get_status()] += 1
+
+    def reply(self, msg, status=200):
+        self.set_status(status)
+        self.set_header('Content-Type', 'application/json')
+        self.finish(json.dumps({'msg': msg}))
+
+    def fail(self, status, message):
+        self.reply(message, status)
+
+    def get_json(self)->dict:
+        return json.loads(self.request.body or b'{}')
+
+    def get_page(self, items)->list:
+        offset = int(self.get_argument('offset', 0))
+        count = int(self.get_argument('count', 10000))
+        return list(islice(items, offset, offset + count))
+
+
+class TokenHandler(FakeHandler):
+    requires_token = False
+
+    def post(self):
+        user = self.get_json()
+        if user.get('email') is None or user.get('password') is None:
+            return self.fail(401, 'Invalid user')
+        self.reply({'v3': {'access_token': self.service.issue_token()}})
+
+
+class EntityHandler(FakeHandler):
+    """POST/GET/PUT/DELETE of a single route, driver, program or vehicle."""
+
+    def initialize(self, service, kind):
+        super().initialize(service)
+        self.store = service.entities[kind]
+        self.kind = kind
+
+    def get_entity(self):
+        entity = self.store.get(self.get_argument('id', None))
+        if entity is None:
+            self.fail(404, f'The {self.kind} does not exist')
+        return entity
+
+    def post(self):
+        entity = self.service.create(self.kind, self.get_json())
+        self.reply(entity)
+
+    def get(self):
+        entity = self.get_entity()
+        if entity is not None:
+            self.reply(entity)
+
+    def put(self):
+        entity = self.get_entity()
+        if entity is not None:
+            self.service.update(self.kind, entity['id'], self.get_json())
+            self.reply({'id': entity['id']})
+
+    def delete(self):
+        entity = self.get_entity()
+        if entity is not None:
+            del self.store[entity['id']]
+            self.reply({'id': entity['id']})
+
+
+class PagedListHandler(FakeHandler):
+    """route/list, driver/list, list and device/list."""
+
+    def initialize(self, service, kind):
+        super().initialize(service)
+        self.store = service.entities[kind]
+
+    def get(self):
+        search_id = self.get_argument('search_id', None)
+        program_id = self.get_argument('program_id', None)
+        if search_id is not None:
+            items = [self.store[search_id]] if search_id in self.store else []
+        else:
+            items = self.store.values()
+        if program_id is not None:
+            items = (x for x in items if x.get('program_id') == program_id)
+        self.reply({'items': self.get_page(items)})
+
+
+class ProgramListHandler(FakeHandler):
+    def get(self):
+        programs = self.service.entities['program']
+        search_id = self.get_argument('search_id', None)
+        if search_id is not None:
+            self.reply([programs[search_id]] if search_id in programs else [])
+        else:
+            self.reply(list(programs.values()))
+
+
+class ProgramSearchHandler(FakeHandler):
+    def get(self):
+        program = self.service.entities['program'].get(self.get_argument('id'))
+        self.reply([program] if program is not None else [])
+
+
+class ProgramLinkHandler(FakeHandler):
+    def put(self):
+        body = self.get_json()
+        if body.get('program_id') not in self.service.entities['program']:
+            return self.fail(404, 'The program does not exist')
+        vehicles = self.service.entities['item']
+        for vehicle_id in body.get('vehicle_ids', []):
+            if vehicle_id in vehicles:
+                vehicles[vehicle_id]['program_id'] = body['program_id']
+        self.reply({'program_id': body['program_id']})
+
+
+class ByDeviceHandler(FakeHandler):
+    def get(self):
+        device_ids = set(self.get_argument('device_ids').split(','))
+        vehicles = [x for x in self.service.entities['item'].values() if x.get('device_mac') in device_ids]
+        self.reply({self.get_argument('org_name'): vehicles})
+
+
+class EventListHandler(FakeHandler):
+    def get(self):
+        start = int(self.get_argument('start_time'))
+        end = int(self.get_argument('end_time'))
+        self.reply({'list': [x for x in self.service.events if start <= x['time'] <= end]})
+
+
+class TelematicHandler(FakeHandler):
+    def get(self):
+        id = self.get_argument('id')
+        start = int(self.get_argument('start_time'))
+        end = int(self.get_argument('end_time'))
+        chart_granularity = int(self.get_argument('chart_granularity'))
+        map_granularity = int(self.get_argument('map_granularity'))
+        chart = [{'time': t, 'mileage': t % 9973, 'fuel_level': t % 100}
+                for t in range(start, end, chart_granularity)]
+        points = [{'time': t, 'lat': 25.0 + t % 1000 / 1e4, 'lng': 121.5 + t % 1000 / 1e4}
+                for t in range(start, end, map_granularity)]
+        self.reply({'id': id, 'chart': chart, 'map': points})
+
+
+class RealtimeHandler(FakeHandler):
+    def post(self):
+        body = self.get_json()
+        fields = body.get('fields', [])
+        realtime = {}
+        for vehicle_id in body.get('vehicle_ids', []):
+            status = self.service.get_realtime(vehicle_id)
+            realtime[vehicle_id] = {field: status.get(field) for field in fields}
+        self.reply(realtime)
+
+
+class AdminHandler(FakeHandler):
+    """Seed the store or expire the tokens of a service running in another process."""
+
+    async def prepare(self):
+        pass
+
+    def post(self, action):
+        if action == 'seed':
+            body = self.get_json()
+            self.reply(self.service.seed(body['kind'], body['count']))
+        elif action == 'expire_tokens':
+            self.service.expire_tokens()
+            self.reply('ok')
+        else:
+            self.fail(404, f'Unknown action {action}')
+
+
+class FakeVehicleService:
+    """An in-memory stand-in for the vehicle and auth APIs used by VehicleClient.
+
+    `latency` delays every request by that many seconds, and `slow_rate` of
+    them by `slow_latency` more, for a slow tail. `error_rate`,
+    `unauthorized_rate` and `drop_rate` are the chances that a request is
+    answered with `error_code`, with 401, or not answered at all (the client
+    sees a 599). Tokens expire after `token_ttl` seconds.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, error_code=503, unauthorized_rate=0.0,
+                 drop_rate=0.0, token_ttl=3600, seed=None, slow_rate=0.0, slow_latency=1.0):
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.unauthorized_rate = unauthorized_rate
+        self.drop_rate = drop_rate
+        self.token_ttl = token_ttl
+        self.random = random.Random(seed)
+        self.entities = {'route': {}, 'driver': {}, 'program': {}, 'item': {}, 'device': {}}
+        self.tokens = {}
+        self.realtime = {}
+        self.events = [{'id': str(uuid.UUID(int=i)),
+                        'vehicle_id': config.telematic_vehicle_id,
+                        'type': 'engine_light_on',
+                        'time': 1585149293 + i * 600} for i in range(100)]
+        self.request_count = 0
+        self.status_counts = Counter()
+        self.server = None
+        self.port = None
+
+    def make_app(self)->tornado.web.Application:
+        prefix = '/api/v3/vehicle/'
+        args = {'service': self}
+        return tornado.web.Application([
+            ('/api/v3/auth/token', TokenHandler, args),
+            (prefix + 'route', EntityHandler, dict(args, kind='route')),
+            (prefix + 'route/list', PagedListHandler, dict(args, kind='route')),
+            (prefix + 'driver', EntityHandler, dict(args, kind='driver')),
+            (prefix + 'driver/list', PagedListHandler, dict(args, kind='driver')),
+            (prefix + 'program', EntityHandler, dict(args, kind='program')),
+            (prefix + 'program/list', ProgramListHandler, args),
+            (prefix + 'program/search', ProgramSearchHandler, args),
+            (prefix + 'program/link', ProgramLinkHandler, args),
+            (prefix + 'item', EntityHandler, dict(args, kind='item')),
+            (prefix + 'list', PagedListHandler, dict(args, kind='item')),
+            (prefix + 'list/by_device', ByDeviceHandler, args),
+            (prefix + 'device/list', PagedListHandler, dict(args, kind='device')),
+            (prefix + 'event/list', EventListHandler, args),
+            (prefix + 'telematic', TelematicHandler, args),
+            (prefix + 'realtime', RealtimeHandler, args),
+            ('/_admin/(.*)', AdminHandler, args),
+        ])
+
+    def listen(self, port=0, address='127.0.0.1')->int:
+        """Start serving on the running event loop and return the port."""
+
+        sockets = bind_sockets(port, address)
+        self.server = HTTPServer(self.make_app())
+        self.server.add_sockets(sockets)
+        self.port = sockets[0].getsockname()[1]
+        return self.port
+
+    def stop(self):
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+
+    @property
+    def vehicle_entry_point(self)->str:
+        return f'http://127.0.0.1:{self.port}/api/v3/vehicle/'
+
+    @property
+    def auth_entry_point(self)->str:
+        return f'http://127.0.0.1:{self.port}/api/v3/auth/token'
+
+    def use(self):
+        """Point the VehicleClient instances created from now on at this service."""
+
+        config.vehicle_entry_point = self.vehicle_entry_point
+        config.auth_entry_point = self.auth_entry_point
+
+    def issue_token(self)->str:
+        expires_at = int(time.time() + self.token_ttl)
+        payload = json.dumps({'exp': expires_at, 'jti': len(self.tokens)}).encode()
+        token = 'eyJhbGciOiJub25lIn0.' + base64.urlsafe_b64encode(payload).decode().rstrip('=') + '.fake'
+        self.tokens[token] = expires_at
+        return token
+
+    def is_valid(self, authorization)->bool:
+        if not authorization or not authorization.startswith('Bearer '):
+            return False
+        expires_at = self.tokens.get(authorization[len('Bearer '):])
+        return expires_at is not None and expires_at > time.time()
+
+    def expire_tokens(self):
+        """Make every token issued so far invalid."""
+
+        self.tokens.clear()
+
+    def create(self, kind, fields)->dict:
+        entity = dict(fields, id=str(uuid.uuid4()))
+        self.entities[kind][entity['id']] = entity
+        device_mac = fields.get('device_mac')
+        if kind == 'item' and device_mac and device_mac not in self.entities['device']:
+            self.entities['device'][device_mac] = {'id': device_mac, 'name': device_mac, 'mac': device_mac}
+        return entity
+
+    def update(self, kind, id, fields):
+        self.entities[kind][id].update(fields, id=id)
+
+    def seed(self, kind, count, prefix='script test')->list:
+        """Create `count` entities directly in the store and return their ids."""
+
+        return [self.create(kind, {'name': f'{prefix} {i}'})['id'] for i in range(count)]
+
+    def get_realtime(self, vehicle_id)->dict:
+        status = {'vin': f'VIN{vehicle_id[:8].upper()}',
+                  'is_engine_light_on': False,
+                  'device_status': 'online',
+                  'camera_info': {'count': 2}}
+        status.update(self.realtime.get(vehicle_id, {}))
+        return status
+
+    def set_realtime(self, vehicle_id, **fields):
+        self.realtime.setdefault(vehicle_id, {}).update(fields)
+
+
+class FakeServiceProcess:
+    """A FakeVehicleService in a process of its own, started with the command line of this module.
+
+    `args` are options of the command line, e.g. ['--latency', '0.01']. The
+    work of the service is then not measured with the client's, as it is
+    when both share one process and event loop.
+    """
+
+    def __init__(self, args=()):
+        self.args = list(args)
+        self.process = None
+        self.auth_entry_point = None
+        self.vehicle_entry_point = None
+
+    def start(self):
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--port', '0', '--quiet']
+                                        + self.args,
+                                        stdout=subprocess.PIPE, universal_newlines=True)
+        for _ in range(2):
+            line = self.process.stdout.readline()
+            if not line:
+                self.stop()
+                raise RuntimeError('The fake service did not start.')
+            name, _, value = line.partition(' = ')
+            setattr(self, name, ast.literal_eval(value.strip()))
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+            self.process.stdout.close()
+            self.process = None
+
+    def use(self):
+        """Point the VehicleClient instances created from now on at this service."""
+
+        config.vehicle_entry_point = self.vehicle_entry_point
+        config.auth_entry_point = self.auth_entry_point
+
+    async def admin(self, action, body=None):
+        parts = urlsplit(self.auth_entry_point)
+        response = await AsyncHTTPClient().fetch(f'{parts.scheme}://{parts.netloc}/_admin/{action}',
+                                                 method='POST', body=json.dumps(body or {}))
+        return json.loads(response.body)['msg']
+
+    async def seed(self, kind, count)->list:
+        return await self.admin('seed', {'kind': kind, 'count': count})
+
+    async def expire_tokens(self):
+        await self.admin('expire_tokens')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve an in-memory stand-in for the vehicle and auth APIs.')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='share of requests that are slow')
+    parser.add_argument('--slow-latency', type=float, default=1.0, help='seconds added to the slow requests')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-code', type=int, default=503)
+    parser.add_argument('--unauthorized-rate', type=float, default=0.0)
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--token-ttl', type=int, default=3600)
+    parser.add_argument('--seed', type=int, default=None, help='seed of the injected failures')
+    parser.add_argument('--quiet', action='store_true', help='do not log the failed requests')
+    args = parser.parse_args()
+
+    if args.quiet:
+        logging.getLogger('tornado.access').disabled = True
+
+    async def serve():
+        service = FakeVehicleService(latency=args.latency,
+                                     error_rate=args.error_rate,
+                                     error_code=args.error_code,
+                                     unauthorized_rate=args.unauthorized_rate,
+                                     drop_rate=args.drop_rate,
+                                     token_ttl=args.token_ttl,
+                                     slow_rate=args.slow_rate,
+                                     slow_latency=args.slow_latency,
+                                     seed=args.seed)
+        service.listen(args.port)
+        print(f'auth_entry_point = {service.auth_entry_point!r}', flush=True)
+        print(f'vehicle_entry_point = {service.vehicle_entry_point!r}', flush=True)
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main()
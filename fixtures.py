@@ -0,0 +1,91 @@
+from batch import run_batch, response_error
+from config import fixture_concurrency, cleanup_concurrency
+import asyncio
+
+
+class FixturePool:
+    """Entities created ahead of the tests that need them, and removed after.
+
+    Every kind is registered with the coroutine function that creates one
+    entity and the one that deletes it. prepare() creates the copies the
+    tests are expected to take, concurrently. Tests that only read share one
+    copy per kind through shared(); tests that modify or delete an entity
+    take one nobody else sees through exclusive(), which creates another
+    copy when the prepared ones are used up. release() deletes everything
+    the pool created, in bulk.
+    """
+
+    def __init__(self, concurrency=fixture_concurrency):
+        self.concurrency = concurrency
+        self.kinds = {}
+        self.spare = {}
+        self.shared_copies = {}
+        self.created = {}
+
+    def register(self, kind, create, delete, key=None):
+        """`create()` returns a new entity, `delete(key(entity))` removes it."""
+
+        self.kinds[kind] = (create, delete, key or (lambda entity: entity))
+        self.spare.setdefault(kind, [])
+        self.created.setdefault(kind, [])
+
+    async def prepare(self, counts):
+        """Create `counts[kind]` copies of every kind up front."""
+
+        kinds = [kind for kind, count in counts.items() for _ in range(count)]
+        batch = await run_batch(self.create, kinds, self.concurrency)
+        for kind, entity in zip(kinds, batch.results):
+            if entity is not None:
+                self.spare[kind].append(entity)
+        return batch
+
+    async def create(self, kind):
+        create, delete, key = self.kinds[kind]
+        entity = await create()
+        if entity is None:
+            raise RuntimeError(f'Failed to create a {kind} fixture.')
+        self.created[kind].append(entity)
+        return entity
+
+    async def exclusive(self, kind):
+        """Return an entity of `kind` that no other test is given."""
+
+        if self.spare[kind]:
+            return self.spare[kind].pop()
+        return await self.create(kind)
+
+    async def shared(self, kind):
+        """Return the entity of `kind` that all the reading tests share."""
+
+        future = self.shared_copies.get(kind)
+        if future is None:
+            future = self.shared_copies[kind] = asyncio.ensure_future(self.exclusive(kind))
+            future.add_done_callback(lambda future: self._shared_created(kind, future))
+        return await asyncio.shield(future)
+
+    def _shared_created(self, kind, future):
+        # Let the next test try again rather than share the failure.
+        if future.cancelled() or future.exception() is not None:
+            self.shared_copies.pop(kind, None)
+
+    async def release(self)->dict:
+        """Delete every entity the pool created and return the BatchResult of each kind."""
+
+        batches = {}
+        for kind, entities in self.created.items():
+            if not entities:
+                continue
+            create, delete, key = self.kinds[kind]
+            keys = [key(entity) for entity in entities]
+            batches[kind] = await run_batch(delete, keys, cleanup_concurrency, self._delete_error)
+            self.created[kind] = []
+            self.spare[kind] = []
+        self.shared_copies.clear()
+        return batches
+
+    @staticmethod
+    def _delete_error(response):
+        # The tests of deletes remove their exclusive copy themselves.
+        if response is not None and response.code == 404:
+            return None
+        return response_error(response)
@@ -0,0 +1,84 @@
+from config import hedge_percentile, hedge_max_extra, hedge_min_samples
+import asyncio
+
+
+class HedgePolicy:
+    """Send a second copy of a slow idempotent request and use the first answer.
+
+    The copy is sent once the request has taken longer than the
+    `percentile` latency of its endpoint, known after `min_samples`
+    requests. Every request adds `max_extra` of a hedge to a bucket holding
+    at most `burst`, and a hedge takes a whole one, so hedging adds at most
+    about that fraction of load even when the whole service is slow.
+    """
+
+    def __init__(self, percentile=hedge_percentile, max_extra=hedge_max_extra,
+                 min_samples=hedge_min_samples, burst=10):
+        self.percentile = percentile
+        self.max_extra = max_extra
+        self.min_samples = min_samples
+        self.burst = burst
+        self.tokens = burst
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+        self.capped = 0
+
+    def get_delay(self, latencies):
+        """Return the seconds to wait before hedging, or None when the latencies are not known yet."""
+
+        if latencies is None or latencies.count < self.min_samples:
+            return None
+        return latencies.percentile(self.percentile)
+
+    async def send(self, latencies, fetch):
+        """Await `fetch()`, and a second `fetch()` if the first one is slower than usual."""
+
+        self.requests += 1
+        self.tokens = min(self.burst, self.tokens + self.max_extra)
+        delay = self.get_delay(latencies)
+        first = asyncio.ensure_future(fetch())
+        if delay is None:
+            return await first
+        second = None
+        try:
+            done, pending = await asyncio.wait({first}, timeout=delay)
+            if done:
+                return first.result()
+            if self.tokens < 1:
+                self.capped += 1
+                return await first
+            self.tokens -= 1
+            self.fired += 1
+            second = asyncio.ensure_future(fetch())
+            pending = {first, second}
+            winner = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # A copy that raised lost, the other one may still answer. Prefer the
+                # first copy on a tie, and a success over a failure still racing another copy.
+                for task in (first, second):
+                    if task not in done or task.exception() is not None:
+                        continue
+                    if winner is None or (winner.result().code >= 500 and task.result().code < 500):
+                        winner = task
+                if winner is not None and winner.result().code < 500:
+                    break
+            if winner is None:
+                # Both copies raised, raise the error of the first one.
+                return first.result()
+            response = winner.result()
+            if winner is second:
+                self.won += 1
+            return response
+        finally:
+            for task in (first, second):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self)->dict:
+        return {'requests': self.requests,
+                'fired': self.fired,
+                'won': self.won,
+                'capped': self.capped,
+                'extra_load': self.fired / self.requests if self.requests else 0.0}
@@ -0,0 +1,317 @@
+from vehicle_client import VehicleClient
+from transport import Transport
+from retry import RetryPolicy
+from hedge import HedgePolicy
+from metrics import LatencyHistogram, EndpointMetrics
+from config import max_clients, retry_max_attempts
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+import argparse
+import asyncio
+import json
+import math
+import random
+import uuid
+
+
+OPERATIONS = {
+    'get_route_list': lambda client: client.get_route_list(),
+    'get_driver_list': lambda client: client.get_driver_list(),
+    'get_program_list': lambda client: client.get_program_list(),
+    'get_list': lambda client: client.get_list(),
+    'get_device_list': lambda client: client.get_device_list(),
+    'get_event_list': lambda client: client.get_event_list(start='1585149293', end='1585149293000'),
+    'get_telematic': lambda client: client.get_telematic(),
+    'post_realtime': lambda client: client.post_realtime(),
+    'post_route': lambda client: client.post_route(f'script test {uuid.uuid4()}'),
+    'post_driver': lambda client: client.post_driver(f'script test {uuid.uuid4()}'),
+}
+
+DEFAULT_MIX = {'get_list': 70, 'post_realtime': 20, 'get_route_list': 10}
+
+
+def parse_mix(text)->dict:
+    """Parse 'get_list=70,post_realtime=20' into {'get_list': 70.0, 'post_realtime': 20.0}."""
+
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f'Unknown operation {name!r}, choose from {", ".join(OPERATIONS)}.')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class OperationStats:
+    def __init__(self):
+        self.sent = 0
+        self.dropped = 0
+        self.errors = 0
+        self.latencies = LatencyHistogram()
+
+    def merge(self, other):
+        self.sent += other.sent
+        self.dropped += other.dropped
+        self.errors += other.errors
+        self.latencies.merge(other.latencies)
+
+    def to_dict(self)->dict:
+        return {'sent': self.sent,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'latencies': self.latencies.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.sent = data['sent']
+        stats.dropped = data['dropped']
+        stats.errors = data['errors']
+        stats.latencies = LatencyHistogram.from_dict(data['latencies'])
+        return stats
+
+    def summary(self, elapsed)->dict:
+        completed = self.latencies.count
+        latencies = self.latencies.summary()
+        return {'sent': self.sent,
+                'completed': completed,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'error_rate': self.errors / completed if completed else 0.0,
+                'throughput': completed / elapsed if elapsed else 0.0,
+                'p50_ms': latencies['p50_ms'],
+                'p95_ms': latencies['p95_ms'],
+                'p99_ms': latencies['p99_ms'],
+                'max_ms': latencies['max_ms']}
+
+
+class LoadGenerator:
+    """Offer a weighted mix of VehicleClient calls at a target request rate.
+
+    The generator is open-loop: requests are sent at their scheduled time
+    whether or not earlier ones have finished, so a slow server cannot
+    quietly lower the offered rate. Latency is measured from the scheduled
+    time, which keeps the delays of an overloaded client in the numbers.
+    When `max_outstanding` requests are already in flight, a new one is
+    counted as dropped instead of being delayed.
+    """
+
+    def __init__(self, client, mix, rps, duration, ramp_up=0.0, max_outstanding=10000, seed=None):
+        self.client = client
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.rps = rps
+        self.duration = duration
+        self.ramp_up = min(ramp_up, duration)
+        self.max_outstanding = max_outstanding
+        self.random = random.Random(seed)
+        self.stats = {name: OperationStats() for name in self.names}
+        self.outstanding = 0
+        self.elapsed = 0.0
+
+    def arrival_time(self, n)->float:
+        """Return the scheduled time of the n-th request.
+
+        The rate grows linearly from 0 to `rps` during the ramp-up, so the
+        number of requests sent by time t is rps * t^2 / (2 * ramp_up).
+        """
+
+        ramp_requests = self.rps * self.ramp_up / 2
+        if n < ramp_requests:
+            return math.sqrt(2 * self.ramp_up * n / self.rps)
+        return self.ramp_up + (n - ramp_requests) / self.rps
+
+    async def run(self)->dict:
+        loop = asyncio.get_event_loop()
+        tasks = set()
+        started = loop.time()
+        n = 0
+        while True:
+            scheduled = self.arrival_time(n)
+            if scheduled >= self.duration:
+                break
+            delay = started + scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            name = self.random.choices(self.names, self.weights)[0]
+            if self.outstanding >= self.max_outstanding:
+                self.stats[name].dropped += 1
+            else:
+                self.outstanding += 1
+                task = asyncio.ensure_future(self.issue(name, started + scheduled))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            n += 1
+        if tasks:
+            await asyncio.wait(tasks)
+        self.elapsed = loop.time() - started
+        return self.summary()
+
+    async def issue(self, name, scheduled):
+        stats = self.stats[name]
+        stats.sent += 1
+        try:
+            response = await OPERATIONS[name](self.client)
+        finally:
+            self.outstanding -= 1
+        stats.latencies.record(asyncio.get_event_loop().time() - scheduled)
+        if response is None or response.error:
+            stats.errors += 1
+
+    def summary(self)->dict:
+        return summarize(self.stats, self.rps, self.duration, self.ramp_up, self.elapsed)
+
+
+def summarize(stats, rps, duration, ramp_up, elapsed)->dict:
+    """Summarize the OperationStats of every operation."""
+
+    operations = {name: operation.summary(elapsed) for name, operation in stats.items()}
+    total = OperationStats()
+    for operation in stats.values():
+        total.merge(operation)
+    return {'target_rps': rps,
+            'duration': duration,
+            'ramp_up': ramp_up,
+            'elapsed': elapsed,
+            'total': total.summary(elapsed),
+            'operations': operations}
+
+
+def add_counts(stats)->dict:
+    """Add up the counters of several stats() dicts, e.g. RetryPolicy.stats() of every process."""
+
+    total = {}
+    for row in stats:
+        for key, value in row.items():
+            if isinstance(value, dict):
+                total[key] = dict(Counter(total.get(key, {})) + Counter(value))
+            else:
+                total[key] = total.get(key, 0) + value
+    return total
+
+
+def print_summary(summary):
+    print(f"Target {summary['target_rps']} rps for {summary['duration']}s "
+          f"(ramp-up {summary['ramp_up']}s), finished in {summary['elapsed']:.1f}s")
+    print(f"{'operation':<18}{'sent':>8}{'dropped':>9}{'rps':>9}{'errors':>8}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    rows = list(summary['operations'].items()) + [('total', summary['total'])]
+    for name, row in rows:
+        print(f"{name:<18}{row['sent']:>8}{row['dropped']:>9}{row['throughput']:>9.1f}"
+              f"{row['error_rate']:>8.1%}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}"
+              f"{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}")
+    retry = summary.get('retry')
+    if retry is not None:
+        print(f"Retries: {retry['retries']} (amplification {retry['amplification']:.2f}x), "
+              f"budget exhausted: {retry['budget_exhausted']}, gave up: {retry['gave_up']}")
+    hedge = summary.get('hedge')
+    if hedge is not None:
+        print(f"Hedges fired: {hedge['fired']} ({hedge['extra_load']:.1%} extra load), "
+              f"won: {hedge['won']}, capped: {hedge['capped']}")
+
+
+async def generate_load(mix, rps, duration, ramp_up=0.0, max_clients=max_clients,
+                        max_outstanding=10000, seed=None, max_attempts=retry_max_attempts, hedge=False):
+    client = VehicleClient(Transport(max_clients=max_clients),
+                           retry=RetryPolicy(max_attempts=max_attempts),
+                           hedge=HedgePolicy() if hedge else None)
+    await client.refresh_token()
+    generator = LoadGenerator(client, mix, rps, duration, ramp_up, max_outstanding, seed)
+    await generator.run()
+    return client, generator
+
+
+async def run_load(*args, **kwargs)->dict:
+    client, generator = await generate_load(*args, **kwargs)
+    summary = generator.summary()
+    summary['transport'] = client.transport.stats()
+    summary['endpoints'] = client.metrics.report()
+    summary['retry'] = client.retry.stats()
+    if client.hedge is not None:
+        summary['hedge'] = client.hedge.stats()
+    return summary
+
+
+async def run_load_worker(options)->dict:
+    """Generate load in this process and return what was measured as plain data."""
+
+    client, generator = await generate_load(**options)
+    return {'stats': {name: stats.to_dict() for name, stats in generator.stats.items()},
+            'elapsed': generator.elapsed,
+            'metrics': client.metrics.to_dict(),
+            'transport': client.transport.stats(),
+            'retry': client.retry.stats(),
+            'hedge': client.hedge.stats() if client.hedge is not None else None}
+
+
+def run_load_process(options)->dict:
+    return asyncio.run(run_load_worker(options))
+
+
+def run_load_sharded(processes, mix, rps, duration, ramp_up=0.0, seed=None, **options)->dict:
+    """Split the load across `processes` processes, each with its own client and token.
+
+    Every process offers rps / processes, and their latency histograms are
+    merged into one summary.
+    """
+
+    workers = [dict(options, mix=mix, rps=rps / processes, duration=duration, ramp_up=ramp_up,
+                    seed=None if seed is None else seed + index)
+               for index in range(processes)]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        results = list(executor.map(run_load_process, workers))
+
+    stats = {name: OperationStats() for name in mix}
+    metrics = EndpointMetrics()
+    for result in results:
+        for name, data in result['stats'].items():
+            stats[name].merge(OperationStats.from_dict(data))
+        metrics.merge(EndpointMetrics.from_dict(result['metrics']))
+    summary = summarize(stats, rps, duration, ramp_up, max(result['elapsed'] for result in results))
+    summary['processes'] = processes
+    summary['transport'] = [result['transport'] for result in results]
+    summary['endpoints'] = metrics.report()
+    summary['retry'] = retry = add_counts(result['retry'] for result in results)
+    retry['amplification'] = (retry['requests'] + retry['retries']) / retry['requests'] if retry['requests'] else 1.0
+    if options.get('hedge'):
+        summary['hedge'] = hedge = add_counts(result['hedge'] for result in results)
+        hedge['extra_load'] = hedge['fired'] / hedge['requests'] if hedge['requests'] else 0.0
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offer a weighted mix of vehicle API calls at a fixed rate.')
+    parser.add_argument('--rps', type=float, default=10.0, help='target requests per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to send requests for')
+    parser.add_argument('--ramp-up', type=float, default=0.0, help='seconds to reach the target rate')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='weighted operations, e.g. get_list=70,post_realtime=20,get_route_list=10')
+    parser.add_argument('--max-clients', type=int, default=max_clients, help='concurrent connections')
+    parser.add_argument('--max-outstanding', type=int, default=10000,
+                        help='requests in flight before new ones are dropped')
+    parser.add_argument('--max-attempts', type=int, default=retry_max_attempts,
+                        help='sends per request including retries, 1 to disable retries')
+    parser.add_argument('--hedge', action='store_true', help='hedge slow GET requests')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='processes to split the load across, each with its own event loop and client')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args()
+
+    if args.processes > 1:
+        summary = run_load_sharded(args.processes, args.mix, args.rps, args.duration, args.ramp_up, args.seed,
+                                   max_clients=args.max_clients, max_outstanding=args.max_outstanding,
+                                   max_attempts=args.max_attempts, hedge=args.hedge)
+    else:
+        summary = asyncio.run(run_load(args.mix, args.rps, args.duration, args.ramp_up,
+                                       args.max_clients, args.max_outstanding, args.seed,
+                                       args.max_attempts, args.hedge))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary)
+
+
+if __name__ == '__main__':
+    main()
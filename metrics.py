@@ -0,0 +1,127 @@
+from collections import Counter
+import math
+
+
+class LatencyHistogram:
+    """A log-bucketed latency histogram in the style of HdrHistogram.
+
+    Every bucket is `precision` wider than the one before it, so any
+    percentile is off by at most that fraction while recording stays one
+    log() and one dict update. Values are in seconds.
+    """
+
+    def __init__(self, precision=0.01, lowest=1e-6):
+        self.precision = precision
+        self.lowest = lowest
+        self._log_base = math.log1p(precision)
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        index = int(math.log(value / self.lowest) / self._log_base) if value > self.lowest else 0
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p)->float:
+        """Return the value below which `p` percent of the recorded values fall."""
+
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self.max, self.lowest * (1 + self.precision) ** (index + 1))
+        return self.max
+
+    @property
+    def mean(self)->float:
+        return self.total / self.count if self.count else 0.0
+
+    def merge(self, other):
+        self.buckets.update(other.buckets)
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def to_dict(self)->dict:
+        """Return the histogram as plain data, e.g. to send it to another process."""
+
+        return {'precision': self.precision,
+                'lowest': self.lowest,
+                'buckets': list(self.buckets.items()),
+                'count': self.count,
+                'total': self.total,
+                'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data['precision'], data['lowest'])
+        histogram.buckets.update(dict(data['buckets']))
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.max = data['max']
+        return histogram
+
+    def summary(self)->dict:
+        return {'count': self.count,
+                'mean_ms': self.mean * 1000,
+                'p50_ms': self.percentile(50) * 1000,
+                'p95_ms': self.percentile(95) * 1000,
+                'p99_ms': self.percentile(99) * 1000,
+                'max_ms': self.max * 1000}
+
+
+class EndpointMetrics:
+    """Latency histograms and status code counts per endpoint, e.g. 'GET route/list'."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+
+    def record(self, endpoint, code, seconds):
+        histogram = self.latencies.get(endpoint)
+        if histogram is None:
+            histogram = self.latencies[endpoint] = LatencyHistogram()
+            self.statuses[endpoint] = Counter()
+        histogram.record(seconds)
+        self.statuses[endpoint][code] += 1
+
+    def merge(self, other):
+        for endpoint, histogram in other.latencies.items():
+            if endpoint not in self.latencies:
+                self.latencies[endpoint] = LatencyHistogram(histogram.precision, histogram.lowest)
+                self.statuses[endpoint] = Counter()
+            self.latencies[endpoint].merge(histogram)
+            self.statuses[endpoint].update(other.statuses[endpoint])
+
+    def to_dict(self)->dict:
+        return {endpoint: {'latencies': histogram.to_dict(),
+                           'statuses': list(self.statuses[endpoint].items())}
+                for endpoint, histogram in self.latencies.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        metrics = cls()
+        for endpoint, row in data.items():
+            metrics.latencies[endpoint] = LatencyHistogram.from_dict(row['latencies'])
+            metrics.statuses[endpoint] = Counter(dict(row['statuses']))
+        return metrics
+
+    def report(self)->dict:
+        return {endpoint: dict(self.latencies[endpoint].summary(),
+                                statuses=dict(self.statuses[endpoint]))
+                for endpoint in sorted(self.latencies)}
+
+    def print_report(self):
+        print(f"{'endpoint':<28}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}  statuses")
+        for endpoint, row in self.report().items():
+            statuses = ' '.join(f'{code}:{count}' for code, count in sorted(row['statuses'].items()))
+            print(f"{endpoint:<28}{row['count']:>7}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}"
+                  f"{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}  {statuses}")
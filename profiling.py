@@ -0,0 +1,217 @@
+from metrics import LatencyHistogram
+from reporter import _current
+from config import monitor_interval, monitor_slow_callback, profile_interval, profile_path
+from collections import Counter
+import asyncio
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+
+
+_run = asyncio.events.Handle._run
+
+
+def describe(handle)->str:
+    """Name what a loop callback runs, the coroutine for the steps of a task."""
+
+    callback = handle._callback
+    task = getattr(callback, '__self__', None)
+    if isinstance(task, asyncio.Task):
+        coro = getattr(task, '_coro', None)
+        return f'task {getattr(coro, "__qualname__", coro)}'
+    return getattr(callback, '__qualname__', repr(callback))
+
+
+class SuiteTime:
+    """The callbacks the event loop ran for one suite."""
+
+    def __init__(self):
+        self.busy = 0.0
+        self.callbacks = 0
+        self.slow = 0
+        self.max = 0.0
+
+
+class LoopMonitor:
+    """Tell the time a run spends in the process itself from the time it waits on the network.
+
+    Every callback the event loop runs is timed and charged to the suite of
+    the test it runs for, known from the context of the callback, or to
+    'other'. Callbacks longer than `slow_callback` are kept as slow ones. A
+    task sleeping `interval` at a time records how much later than asked it
+    wakes up, which is how long ready callbacks wait for the loop.
+
+    With `profile` 'cprofile' every suite gets a cProfile.Profile enabled
+    only while its callbacks run, with 'sample' a thread samples the stack
+    of the loop every `profile_interval` seconds and charges it to the suite
+    whose callback is running, or to 'idle' when the loop is waiting.
+
+    Only the callbacks of the loop's own thread are timed, and only on the
+    asyncio event loop. On other loops, like uvloop, the loop runs in debug
+    mode to log slow callbacks instead.
+    """
+
+    def __init__(self, interval=monitor_interval, slow_callback=monitor_slow_callback,
+                 profile=None, profile_interval=profile_interval):
+        if profile not in (None, 'cprofile', 'sample'):
+            raise ValueError(f'Unknown profiler {profile!r}.')
+        self.interval = interval
+        self.slow_callback = slow_callback
+        self.profile = profile
+        self.profile_interval = profile_interval
+        self.lag = LatencyHistogram()
+        self.suites = {}
+        self.slow = []
+        self.profilers = {}
+        self.samples = {}
+        self.running = None
+        self.timing = False
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def start(self):
+        """Start measuring, from a coroutine running on the loop to measure."""
+
+        loop = asyncio.get_event_loop()
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+        self.thread = threading.get_ident()
+        self.timing = isinstance(loop, asyncio.BaseEventLoop)
+        if self.timing:
+            asyncio.events.Handle._run = lambda handle: self.run_handle(handle)
+        else:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.slow_callback
+        self.lag_task = asyncio.ensure_future(self.sample_lag())
+        self.stopped = threading.Event()
+        self.sampler = None
+        if self.profile == 'sample':
+            self.sampler = threading.Thread(target=self.sample_stacks, daemon=True)
+            self.sampler.start()
+
+    def stop(self):
+        self.lag_task.cancel()
+        asyncio.events.Handle._run = _run
+        if not self.timing:
+            asyncio.get_event_loop().set_debug(False)
+        self.stopped.set()
+        if self.sampler is not None:
+            self.sampler.join()
+        self.wall += time.perf_counter() - self.started
+        self.cpu += time.process_time() - self.cpu_started
+
+    def run_handle(self, handle):
+        if threading.get_ident() != self.thread:
+            return _run(handle)
+        result = handle._context.get(_current)
+        suite = result.suite if result is not None else 'other'
+        profiler = None
+        if self.profile == 'cprofile':
+            profiler = self.profilers.setdefault(suite, cProfile.Profile())
+        self.running = suite
+        started = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            _run(handle)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            elapsed = time.perf_counter() - started
+            self.running = None
+            stats = self.suites.get(suite)
+            if stats is None:
+                stats = self.suites[suite] = SuiteTime()
+            stats.busy += elapsed
+            stats.callbacks += 1
+            stats.max = max(stats.max, elapsed)
+            if elapsed >= self.slow_callback:
+                stats.slow += 1
+                test = f'{suite}.{result.name}' if result is not None else suite
+                self.slow.append((elapsed, test, describe(handle)))
+
+    async def sample_lag(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag.record(max(0.0, loop.time() - expected))
+
+    def sample_stacks(self):
+        while not self.stopped.wait(self.profile_interval):
+            frame = sys._current_frames().get(self.thread)
+            if frame is None:
+                continue
+            suite = self.running or ('idle' if self.timing else 'all')
+            samples = self.samples.get(suite)
+            if samples is None:
+                samples = self.samples[suite] = {'count': 0, 'self': Counter(), 'total': Counter()}
+            samples['count'] += 1
+            samples['self'][self.frame_key(frame)] += 1
+            seen = set()
+            while frame is not None:
+                key = self.frame_key(frame)
+                if key not in seen:
+                    seen.add(key)
+                    samples['total'][key] += 1
+                frame = frame.f_back
+
+    @staticmethod
+    def frame_key(frame)->str:
+        code = frame.f_code
+        return f'{os.path.basename(code.co_filename)}:{code.co_firstlineno} {code.co_name}'
+
+    def stats(self)->dict:
+        busy = sum(stats.busy for stats in self.suites.values())
+        return {'wall': self.wall,
+                'cpu': self.cpu,
+                'busy': busy if self.timing else None,
+                'waiting': self.wall - (busy if self.timing else self.cpu),
+                'lag': self.lag.summary(),
+                'suites': {suite: {'busy': stats.busy,
+                                   'callbacks': stats.callbacks,
+                                   'slow': stats.slow,
+                                   'max': stats.max}
+                           for suite, stats in self.suites.items()},
+                'slow': [{'seconds': elapsed, 'test': test, 'callback': callback}
+                         for elapsed, test, callback in sorted(self.slow, reverse=True)]}
+
+    def save_profiles(self, path=profile_path)->list:
+        """Write the cProfile of every suite to `path` and return the files written."""
+
+        paths = []
+        for suite, profiler in self.profilers.items():
+            paths.append(path.format(suite=suite))
+            profiler.dump_stats(paths[-1])
+        return paths
+
+    def print_report(self, top=10):
+        stats = self.stats()
+        wall = stats['wall'] or 1e-9
+        if stats['busy'] is not None:
+            print(f"Run {stats['wall']:.2f}s: {stats['busy']:.2f}s ({stats['busy'] / wall:.0%}) running callbacks, "
+                  f"{stats['waiting']:.2f}s waiting on the network, process CPU {stats['cpu']:.2f}s")
+        else:
+            print(f"Run {stats['wall']:.2f}s: process CPU {stats['cpu']:.2f}s ({stats['cpu'] / wall:.0%}), "
+                  f"about {stats['waiting']:.2f}s waiting on the network")
+        lag = stats['lag']
+        print(f"Event loop lag p50/p99/max: {lag['p50_ms']:.1f}/{lag['p99_ms']:.1f}/{lag['max_ms']:.1f} ms "
+              f"over {lag['count']} samples")
+        if stats['suites']:
+            print(f"{'suite':<12} {'busy ms':>9} {'callbacks':>10} {'slow':>5} {'max ms':>8}")
+            for suite, row in sorted(stats['suites'].items(), key=lambda item: -item[1]['busy']):
+                print(f"{suite:<12} {row['busy'] * 1000:>9.1f} {row['callbacks']:>10} {row['slow']:>5} "
+                      f"{row['max'] * 1000:>8.1f}")
+        for slow in stats['slow'][:top]:
+            print(f"Slow callback {slow['seconds'] * 1000:.1f} ms in {slow['test']}: {slow['callback']}")
+
+        for suite, profiler in self.profilers.items():
+            print(f'[{suite}] cProfile, by cumulative time')
+            pstats.Stats(profiler, stream=sys.stdout).sort_stats('cumulative').print_stats(top)
+        for suite, samples in sorted(self.samples.items(), key=lambda item: -item[1]['count']):
+            print(f"[{suite}] {samples['count']} samples, total% self% function")
+            for key, count in samples['total'].most_common(top):
+                print(f"{count / samples['count']:>7.1%} {samples['self'][key] / samples['count']:>6.1%} {key}")
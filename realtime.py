@@ -0,0 +1,95 @@
+from vehicle_client import VehicleClient
+from batch import run_batch, response_error
+from config import realtime_fields, realtime_batch_size, realtime_concurrency, realtime_interval
+import argparse
+import asyncio
+import json
+
+
+class RealtimePoller:
+    """Poll the realtime status of many vehicles and keep only what changed.
+
+    Every poll asks for the vehicles in requests of `batch_size` ids, at most
+    `concurrency` of them at the same time, and returns the fields whose
+    value differs from the previous poll as {vehicle_id: {field: value}}.
+    The first poll returns everything.
+    """
+
+    def __init__(self, client, vehicle_ids, fields=realtime_fields, batch_size=realtime_batch_size,
+                 concurrency=realtime_concurrency, interval=realtime_interval):
+        self.client = client
+        self.vehicle_ids = list(vehicle_ids)
+        self.fields = list(fields)
+        self.batches = [self.vehicle_ids[index:index + batch_size]
+                        for index in range(0, len(self.vehicle_ids), batch_size)]
+        self.concurrency = concurrency
+        self.interval = interval
+        self.state = {}
+        self.polls = 0
+        self.failures = 0
+
+    async def poll(self)->dict:
+        batch = await run_batch(lambda ids: self.client.post_realtime(ids, self.fields),
+                                self.batches, self.concurrency, response_error)
+        self.polls += 1
+        self.failures += len(batch.failures)
+        changes = {}
+        for response in batch.results:
+            if response is None or response.error:
+                continue
+            for vehicle_id, status in json.loads(response.body)['msg'].items():
+                previous = self.state.setdefault(vehicle_id, {})
+                changed = {field: value for field, value in status.items()
+                           if field not in previous or previous[field] != value}
+                if changed:
+                    previous.update(changed)
+                    changes[vehicle_id] = changed
+        return changes
+
+    async def watch(self, polls=None):
+        """Yield the changes of every poll, one poll every `interval` seconds.
+
+        A poll that takes longer than the interval makes the next one start
+        at the following tick instead of right away.
+        """
+
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        count = 0
+        while True:
+            changes = await self.poll()
+            count += 1
+            if changes:
+                yield changes
+            if polls is not None and count >= polls:
+                break
+            if self.interval > 0:
+                ticks = int((loop.time() - started) / self.interval) + 1
+                await asyncio.sleep(started + ticks * self.interval - loop.time())
+
+
+async def watch(vehicle_ids, fields, batch_size, interval, polls):
+    client = VehicleClient()
+    if not vehicle_ids:
+        vehicle_ids = [item['id'] async for item in client.iter_list()]
+    poller = RealtimePoller(client, vehicle_ids, fields, batch_size, interval=interval)
+    print(f'Watching {len(vehicle_ids)} vehicles in {len(poller.batches)} requests every {interval}s')
+    async for changes in poller.watch(polls):
+        for vehicle_id, changed in changes.items():
+            print(json.dumps({'vehicle_id': vehicle_id, 'changed': changed}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the realtime fields of vehicles as they change.')
+    parser.add_argument('vehicle_ids', nargs='*', help='vehicles to watch, default all of them')
+    parser.add_argument('--fields', default=','.join(realtime_fields), help='comma separated fields')
+    parser.add_argument('--batch-size', type=int, default=realtime_batch_size, help='vehicles per request')
+    parser.add_argument('--interval', type=float, default=realtime_interval, help='seconds between polls')
+    parser.add_argument('--polls', type=int, default=None, help='stop after this many polls')
+    args = parser.parse_args()
+
+    asyncio.run(watch(args.vehicle_ids, args.fields.split(','), args.batch_size, args.interval, args.polls))
+
+
+if __name__ == '__main__':
+    main()
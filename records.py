@@ -0,0 +1,102 @@
+from bisect import bisect_left
+
+
+class Record:
+    """A list item reduced to the fields the tests read.
+
+    Records index like the dicts they replace, so x['id'] keeps working. The
+    API dict is only kept, as `raw`, when it is asked for; other fields are
+    read from it when present.
+    """
+
+    __slots__ = ('id', 'name', 'raw')
+    fields = ('id', 'name')
+
+    @classmethod
+    def from_dict(cls, item, keep_raw=False):
+        record = cls.__new__(cls)
+        for field in cls.fields:
+            setattr(record, field, item.get(field))
+        record.raw = item if keep_raw else None
+        return record
+
+    def __getitem__(self, key):
+        if key in self.fields:
+            return getattr(self, key)
+        if self.raw is not None:
+            return self.raw[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        values = ', '.join(f'{field}={getattr(self, field)!r}' for field in self.fields)
+        return f'{type(self).__name__}({values})'
+
+
+class Route(Record):
+    __slots__ = ()
+
+
+class Driver(Record):
+    __slots__ = ()
+
+
+class Vehicle(Record):
+    __slots__ = ('device_mac', 'program_id')
+    fields = ('id', 'name', 'device_mac', 'program_id')
+
+
+class Device(Record):
+    __slots__ = ()
+
+
+class IndexedItems:
+    """List results indexed by id and by name.
+
+    Membership is tested by id (`id in items`), names are looked up with
+    has_name()/with_name(), and with_prefix() finds the names starting with a
+    prefix through a sorted name list that is built on first use.
+    """
+
+    def __init__(self, items=()):
+        self.items = list(items)
+        self.by_id = {}
+        self.by_name = {}
+        for item in self.items:
+            self.by_id[item['id']] = item
+            self.by_name.setdefault(item['name'], []).append(item)
+        self._names = None
+
+    def __contains__(self, id):
+        return id in self.by_id
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, id, default=None):
+        return self.by_id.get(id, default)
+
+    def has_name(self, name)->bool:
+        return name in self.by_name
+
+    def with_name(self, name)->list:
+        return self.by_name.get(name, [])
+
+    def with_prefix(self, prefix)->list:
+        if self._names is None:
+            self._names = sorted(name for name in self.by_name if name is not None)
+        items = []
+        for index in range(bisect_left(self._names, prefix), len(self._names)):
+            name = self._names[index]
+            if not name.startswith(prefix):
+                break
+            items.extend(self.by_name[name])
+        return items
@@ -0,0 +1,235 @@
+from config import report_console, report_jsonl, report_junit
+from termcolor import colored
+from contextvars import ContextVar
+from xml.etree import ElementTree
+import json
+import queue
+import sys
+import threading
+import time
+
+
+_current = ContextVar('result', default=None)
+
+METHOD_COLORS = {'GET': 'blue', 'POST': 'green', 'PUT': 'yellow', 'DELETE': 'red'}
+
+
+class TestResult:
+    """What one test, or one setup/release/clear of a suite, did."""
+
+    def __init__(self, suite, name, kind='test'):
+        self.suite = suite
+        self.name = name
+        self.kind = kind
+        self.started = time.time()
+        self.clock = time.monotonic()
+        self.duration = None
+        self.requests = 0
+        self.checks = []
+        self.errors = []
+        self.lines = []
+
+    @property
+    def outcome(self)->str:
+        if self.errors:
+            return 'error'
+        if any(not passed for method, path, passed in self.checks):
+            return 'failed'
+        return 'passed'
+
+    def to_dict(self)->dict:
+        return {'suite': self.suite,
+                'name': self.name,
+                'kind': self.kind,
+                'outcome': self.outcome,
+                'started': self.started,
+                'duration': self.duration,
+                'requests': self.requests,
+                'checks': [{'method': method, 'path': path, 'passed': passed}
+                           for method, path, passed in self.checks],
+                'errors': self.errors,
+                'lines': self.lines}
+
+    @classmethod
+    def from_dict(cls, data):
+        result = cls(data['suite'], data['name'], data['kind'])
+        result.started = data['started']
+        result.duration = data['duration']
+        result.requests = data['requests']
+        result.checks = [(check['method'], check['path'], check['passed']) for check in data['checks']]
+        result.errors = list(data['errors'])
+        result.lines = [(kind, tuple(line) if kind == 'check' else line) for kind, line in data['lines']]
+        return result
+
+
+def log(text):
+    """Keep a line of output with the current test, or print it when no test is running."""
+
+    result = _current.get()
+    if result is None:
+        print(text)
+    else:
+        result.lines.append(('log', text))
+
+
+def progress(text):
+    """Print a line right away, even from a running test, to show how a long operation is going.
+
+    Progress is not kept with the test, it is only worth seeing while the
+    test runs.
+    """
+
+    # Write past the GroupedOutput of the Runner, which holds a test's output until it ends.
+    stream = getattr(sys.stdout, 'stream', sys.stdout)
+    stream.write(text + '\n')
+    stream.flush()
+
+
+def error(text):
+    result = _current.get()
+    if result is None:
+        print(text)
+    else:
+        result.errors.append(text)
+        result.lines.append(('error', text))
+
+
+def record_check(suite, method, path, passed):
+    """Record whether `method path` behaved as expected, with anything truthy as passed."""
+
+    passed = bool(passed)
+    result = _current.get()
+    if result is None:
+        print(render_check(suite, method, path, passed))
+    else:
+        result.checks.append((method, path, passed))
+        result.lines.append(('check', (method, path, passed)))
+
+
+def count_request():
+    result = _current.get()
+    if result is not None:
+        result.requests += 1
+
+
+def render_check(suite, method, path, passed)->str:
+    status = colored('successful', 'green') if passed else colored('failed', 'red')
+    return f'[{suite}]{colored(method, METHOD_COLORS.get(method))}{path} {status}'
+
+
+class Reporter:
+    """Collect the results of the tests in memory and write them out at the end.
+
+    While a test runs, its request lines, checks and errors are kept with its
+    TestResult instead of being printed. With `console` they are rendered in
+    one piece when the test finishes, by a thread of its own so the event
+    loop goes on with the other tests meanwhile; close() waits for it to
+    catch up. write_jsonl() and write_junit() save all the results.
+    """
+
+    def __init__(self, console=report_console):
+        self.console = console
+        self.results = []
+        self.started = time.time()
+        self.pending = queue.SimpleQueue()
+        self.writer = None
+
+    def start(self, suite, name, kind='test')->TestResult:
+        result = TestResult(suite, name, kind)
+        self.results.append(result)
+        _current.set(result)
+        return result
+
+    def finish(self, result, output=''):
+        """End `result` and hand its lines, followed by `output` the test printed, to the console writer."""
+
+        result.duration = time.monotonic() - result.clock
+        _current.set(None)
+        lines = list(result.lines) if self.console else []
+        if lines or output:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.write_console, daemon=True)
+                self.writer.start()
+            # Past the GroupedOutput of the Runner, as the writer runs outside of any test.
+            self.pending.put((result, lines, output, getattr(sys.stdout, 'stream', sys.stdout)))
+
+    def write_console(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            result, lines, output, stream = item
+            stream.write(''.join(self.render(result, kind, line) + '\n' for kind, line in lines) + output)
+            stream.flush()
+
+    def close(self):
+        """Wait for the console writer to write everything handed to it."""
+
+        if self.writer is not None:
+            self.pending.put(None)
+            self.writer.join()
+            self.writer = None
+
+    def merge(self, results):
+        """Add the results of another reporter, given as TestResult.to_dict() data."""
+
+        self.results.extend(TestResult.from_dict(data) for data in results)
+
+    @staticmethod
+    def render(result, kind, line)->str:
+        if kind == 'check':
+            return render_check(result.suite, *line)
+        return line
+
+    @property
+    def tests(self)->list:
+        return [result for result in self.results if result.kind == 'test']
+
+    def summary(self)->dict:
+        outcomes = [result.outcome for result in self.tests]
+        return {'tests': len(outcomes),
+                'passed': outcomes.count('passed'),
+                'failed': outcomes.count('failed'),
+                'errors': outcomes.count('error'),
+                'requests': sum(result.requests for result in self.results),
+                'seconds': time.time() - self.started}
+
+    def write_jsonl(self, path=report_jsonl):
+        with open(path, 'w') as f:
+            for result in self.results:
+                f.write(json.dumps(result.to_dict()) + '\n')
+
+    def write_junit(self, path=report_junit):
+        suites = ElementTree.Element('testsuites')
+        by_suite = {}
+        for result in self.tests:
+            by_suite.setdefault(result.suite, []).append(result)
+        for name, results in by_suite.items():
+            suite = ElementTree.SubElement(suites, 'testsuite',
+                                           name=name,
+                                           tests=str(len(results)),
+                                           failures=str(sum(r.outcome == 'failed' for r in results)),
+                                           errors=str(sum(r.outcome == 'error' for r in results)),
+                                           time=f'{sum(r.duration or 0.0 for r in results):.3f}')
+            for result in results:
+                case = ElementTree.SubElement(suite, 'testcase',
+                                              classname=name,
+                                              name=result.name,
+                                              time=f'{result.duration or 0.0:.3f}')
+                properties = ElementTree.SubElement(case, 'properties')
+                ElementTree.SubElement(properties, 'property', name='requests', value=str(result.requests))
+                if result.outcome == 'error':
+                    ElementTree.SubElement(case, 'error', message=result.errors[0]).text = '\n'.join(result.errors)
+                elif result.outcome == 'failed':
+                    failed = [f'{method} {path}' for method, path, passed in result.checks if not passed]
+                    ElementTree.SubElement(case, 'failure', message=f"{', '.join(failed)} failed")
+                output = [line if kind != 'check' else f'{line[0]} {line[1]} {"passed" if line[2] else "failed"}'
+                          for kind, line in result.lines]
+                if output:
+                    ElementTree.SubElement(case, 'system-out').text = '\n'.join(output)
+        ElementTree.ElementTree(suites).write(path, encoding='utf-8', xml_declaration=True)
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"{summary['tests']} tests: {summary['passed']} passed, {summary['failed']} failed, "
+              f"{summary['errors']} errors, {summary['requests']} requests in {summary['seconds']:.2f}s")
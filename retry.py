@@ -0,0 +1,100 @@
+from config import retry_statuses, retry_methods, retry_max_attempts, retry_base_delay, retry_max_delay, retry_budget
+from config import retry_timeouts
+from collections import Counter
+import asyncio
+import random
+import sys
+
+
+# CURLE_OPERATION_TIMEDOUT, the errno of a CurlError for a timeout.
+CURL_TIMEOUT = 28
+
+
+def is_timeout(response)->bool:
+    """Whether a response is a connect or request timeout rather than another transport error."""
+
+    # Only the simple backend raises HTTPTimeoutError, and importing it for the
+    # check would load that whole client, so it is looked up when loaded.
+    simple_httpclient = sys.modules.get('tornado.simple_httpclient')
+    if simple_httpclient is not None and isinstance(response.error, simple_httpclient.HTTPTimeoutError):
+        return True
+    return getattr(response.error, 'errno', None) == CURL_TIMEOUT
+
+
+class RetryPolicy:
+    """When and how often a failed request is sent again.
+
+    A response is retried when its status is in `statuses` and its method
+    in `methods`, up to `max_attempts` sends in all. Timeouts are retried
+    only with `timeouts`, as each retry of one waits the whole timeout again. The wait before retry n
+    is drawn uniformly between 0 and base_delay * 2**(n - 1), capped by
+    max_delay (full jitter), or is the Retry-After of the response when that
+    is longer. Retries are also limited by a budget: every request adds
+    `budget` of a retry to a bucket holding at most `burst`, and a retry
+    takes a whole one, so a failing service gets at most about `budget`
+    more traffic instead of `max_attempts` times as much.
+    """
+
+    def __init__(self, statuses=retry_statuses, methods=retry_methods, max_attempts=retry_max_attempts,
+                 base_delay=retry_base_delay, max_delay=retry_max_delay, budget=retry_budget, burst=10,
+                 seed=None, timeouts=retry_timeouts):
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(methods)
+        self.timeouts = timeouts
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.burst = burst
+        self.tokens = burst
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.retries = 0
+        self.retried_statuses = Counter()
+        self.budget_exhausted = 0
+        self.gave_up = 0
+
+    def is_retryable(self, method, response)->bool:
+        if response.code not in self.statuses or method not in self.methods:
+            return False
+        return self.timeouts or response.code != 599 or not is_timeout(response)
+
+    def get_delay(self, retry, response=None)->float:
+        delay = self.random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+        retry_after = response.headers.get('Retry-After') if response is not None and response.headers else None
+        if retry_after is not None:
+            try:
+                delay = max(delay, min(self.max_delay, float(retry_after)))
+            except ValueError:
+                pass
+        return delay
+
+    async def send(self, method, fetch):
+        """Await `fetch()` and send it again while the response is worth retrying."""
+
+        self.requests += 1
+        self.tokens = min(self.burst, self.tokens + self.budget)
+        response = await fetch()
+        attempt = 1
+        while self.is_retryable(method, response):
+            if attempt >= self.max_attempts:
+                self.gave_up += 1
+                break
+            if self.tokens < 1:
+                self.budget_exhausted += 1
+                break
+            self.tokens -= 1
+            self.retries += 1
+            self.retried_statuses[response.code] += 1
+            await asyncio.sleep(self.get_delay(attempt, response))
+            response = await fetch()
+            attempt += 1
+        return response
+
+    def stats(self)->dict:
+        return {'requests': self.requests,
+                'retries': self.retries,
+                'amplification': (self.requests + self.retries) / self.requests if self.requests else 1.0,
+                'retried_statuses': dict(self.retried_statuses),
+                'budget_exhausted': self.budget_exhausted,
+                'gave_up': self.gave_up}
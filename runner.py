@@ -0,0 +1,83 @@
+from config import test_concurrency
+from reporter import Reporter
+from contextvars import ContextVar
+import asyncio
+import io
+import sys
+
+
+_output = ContextVar('output', default=None)
+
+
+class GroupedOutput:
+    """A stdout proxy that keeps the output of each running test together.
+
+    While a test is running, whatever it prints is written to its own buffer
+    instead of the terminal. The buffer is flushed in one piece when the test
+    ends, so the lines of concurrent tests never interleave.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        buffer = _output.get()
+        if buffer is None:
+            return self.stream.write(text)
+        return buffer.write(text)
+
+    def flush(self):
+        if _output.get() is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class Runner:
+    """Run the tests of several suites concurrently.
+
+    Every test of every suite is scheduled as its own task, but no more than
+    `concurrency` of them run at the same time. The fixtures of every suite
+    are set up before any test starts, and they are released and the clear()
+    of the suites run only when all the tests are done, so one suite never
+    removes the data another suite is still working with. The outcome of
+    every test is collected by `reporter`, and a profiling.LoopMonitor given
+    as `monitor` measures the whole run.
+    """
+
+    def __init__(self, concurrency=test_concurrency, reporter=None, monitor=None):
+        self.concurrency = concurrency
+        self.reporter = reporter or Reporter()
+        self.monitor = monitor
+
+    async def run(self, suites):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        stdout = sys.stdout
+        sys.stdout = GroupedOutput(stdout)
+        if self.monitor is not None:
+            self.monitor.start()
+        try:
+            await asyncio.gather(*(self.run_grouped(suite, 'setup', 'setup') for suite in suites))
+            await asyncio.gather(*(self.run_suite(suite) for suite in suites))
+            await asyncio.gather(*(self.run_grouped(suite, 'release', 'release') for suite in suites))
+            await asyncio.gather(*(self.run_grouped(suite, 'clear', 'clear') for suite in suites))
+        finally:
+            if self.monitor is not None:
+                self.monitor.stop()
+            self.reporter.close()
+            sys.stdout = stdout
+
+    async def run_suite(self, suite):
+        await asyncio.gather(*(self.run_grouped(suite, name) for name in suite.tests))
+
+    async def run_grouped(self, suite, name, kind='test'):
+        async with self.semaphore:
+            buffer = io.StringIO()
+            _output.set(buffer)
+            result = self.reporter.start(suite.title, name, kind)
+            try:
+                await getattr(suite, name)()
+            finally:
+                _output.set(None)
+                self.reporter.finish(result, buffer.getvalue())
@@ -0,0 +1,101 @@
+from concurrent.futures import ProcessPoolExecutor
+from config import report_console, report_jsonl, report_junit, event_loop, cassette_mode
+import argparse
+import asyncio
+import importlib
+import os
+
+
+def split(items, shards)->list:
+    """Deal `items` round-robin into at most `shards` non-empty lists."""
+
+    return [part for part in (items[index::shards] for index in range(shards)) if part]
+
+
+def resolve(name):
+    """Import the suite class `name`, either module.Class or a class of test_case."""
+
+    module, _, attr = name.rpartition('.')
+    return getattr(importlib.import_module(module or 'test_case'), attr)
+
+
+async def run_suites(names)->dict:
+    """Run the named suites in this process and return what they did as plain data."""
+
+    from runner import Runner
+    from reporter import Reporter
+    from metrics import EndpointMetrics
+
+    suites = [resolve(name)() for name in names]
+    runner = Runner(reporter=Reporter(console=report_console))
+    await runner.run(suites)
+    metrics = EndpointMetrics()
+    for suite in suites:
+        metrics.merge(suite.client.metrics)
+    recorded = []
+    if cassette_mode is not None:
+        from cassette import recorded_entries
+
+        recorded = recorded_entries()
+    return {'pid': os.getpid(),
+            'suites': list(names),
+            'results': [result.to_dict() for result in runner.reporter.results],
+            'metrics': metrics.to_dict(),
+            'transport': {suite.title: suite.client.transport.stats() for suite in suites},
+            'cassette': recorded}
+
+
+def run_shard(names, loop=event_loop)->dict:
+    from event_loop import install
+
+    install(loop)
+    return asyncio.run(run_suites(names))
+
+
+def run_sharded(names, processes=None, loop=event_loop):
+    """Run the named suites split across `processes` processes, one `loop` event loop and client per suite each.
+
+    Returns a Reporter and an EndpointMetrics with the results and latencies
+    of all the processes merged. What the processes recorded in cassette_mode
+    'record' is saved to one cassette.
+    """
+
+    from reporter import Reporter
+    from metrics import EndpointMetrics
+
+    shards = split(list(names), processes or os.cpu_count() or 1)
+    reporter = Reporter(console=False)
+    metrics = EndpointMetrics()
+    recorded = []
+    with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+        for shard in executor.map(run_shard, shards, [loop] * len(shards)):
+            reporter.merge(shard['results'])
+            metrics.merge(EndpointMetrics.from_dict(shard['metrics']))
+            recorded.extend(shard['cassette'])
+            print(f"Process {shard['pid']} ran {', '.join(shard['suites'])}")
+    if recorded:
+        from cassette import save_entries
+
+        save_entries(recorded)
+    return reporter, metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the test suites split across processes.')
+    parser.add_argument('suites', nargs='+', help='suite classes of test_case or module.Class, e.g. RouteTest DriverTest')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='default one per core')
+    parser.add_argument('--loop', choices=('auto', 'uvloop', 'asyncio'), default=event_loop,
+                        help='event loop of every process, auto uses uvloop when it is installed')
+    args = parser.parse_args()
+
+    reporter, metrics = run_sharded(args.suites, args.processes, args.loop)
+    metrics.print_report()
+    if report_jsonl is not None:
+        reporter.write_jsonl(report_jsonl)
+    if report_junit is not None:
+        reporter.write_junit(report_junit)
+    reporter.print_summary()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import codecs
+import json
+import re
+
+
+_TOKEN = re.compile(r'["{}\[\]:,]')
+_STRING_END = re.compile(r'(?:[^"\\]|\\.)*"', re.DOTALL)
+_WHITESPACE = re.compile(r'[ \t\r\n]*')
+
+
+class ItemStreamParser:
+    """Pull the elements of one array out of a JSON document as it arrives.
+
+    `path` names the keys leading to the array, ('msg', 'items') for the
+    list endpoints. feed() takes the next chunk of the body and returns the
+    elements it completed, so only the element being received is buffered.
+    Everything around the array is skipped without being decoded.
+    """
+
+    def __init__(self, path=('msg', 'items')):
+        self.path = tuple(path)
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.stack = []
+        self.in_array = False
+        self.done = False
+
+    def feed(self, chunk)->list:
+        if self.done:
+            return []
+        self.buffer += self.text_decoder.decode(chunk)
+        if not self.in_array:
+            self._find_array()
+        if self.in_array:
+            return self._read_elements()
+        return []
+
+    def close(self):
+        """Check that the whole array was received."""
+
+        if not self.done:
+            raise ValueError(f"The response ended before the end of {'.'.join(self.path)}.")
+
+    def _find_array(self):
+        """Walk the structure until the array at `path` opens."""
+
+        buffer = self.buffer
+        pos = 0
+        while True:
+            match = _TOKEN.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            token = match.group()
+            index = match.start()
+            if token == '"':
+                end = _STRING_END.match(buffer, index + 1)
+                if end is None:
+                    pos = index
+                    break
+                frame = self.stack[-1] if self.stack else None
+                if frame is not None and frame[0] == '{' and frame[2]:
+                    frame[1] = json.loads(buffer[index:end.end()])
+                    frame[2] = False
+                pos = end.end()
+            elif token == '{':
+                self.stack.append(['{', None, True])
+                pos = index + 1
+            elif token == '[':
+                keys = tuple(frame[1] for frame in self.stack)
+                if keys == self.path and all(frame[0] == '{' for frame in self.stack):
+                    self.in_array = True
+                    pos = index + 1
+                    break
+                self.stack.append(['[', None, False])
+                pos = index + 1
+            elif token in '}]':
+                if self.stack:
+                    self.stack.pop()
+                pos = index + 1
+            elif token == ',':
+                if self.stack and self.stack[-1][0] == '{':
+                    self.stack[-1][2] = True
+                pos = index + 1
+            else:
+                pos = index + 1
+        self.buffer = buffer[pos:]
+
+    def _read_elements(self)->list:
+        buffer = self.buffer
+        pos = 0
+        elements = []
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if char == ']':
+                self.done = True
+                pos += 1
+                break
+            if char == ',':
+                pos += 1
+                continue
+            try:
+                element, end = self.decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # The element is not complete yet.
+                break
+            if not isinstance(element, (dict, list)):
+                # A number may go on in the next chunk, accept it once it is followed by , or ].
+                after = _WHITESPACE.match(buffer, end).end()
+                if after == len(buffer) or buffer[after] not in ',]':
+                    break
+            elements.append(element)
+            pos = end
+        self.buffer = buffer[pos:]
+        return elements
+
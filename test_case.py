@@ -1,21 +1,50 @@
 from vehicle_client import VehicleClient
-from termcolor import colored
 from functools import wraps
 from decorator import clear, exception_handler
+from runner import Runner
+from metrics import EndpointMetrics
+from records import IndexedItems
+from fixtures import FixturePool
+from reporter import log, progress, record_check
+from retry import RetryPolicy
+from breaker import CircuitBreakers
+from config import cleanup_concurrency, response_cache, hedge_requests, cassette_mode, telematic_vehicle_id
+from config import report_jsonl, report_junit
 import asyncio
 import uuid
 import json
 
 
+# One retry budget and one set of circuits for the clients of all the suites,
+# so a failing service gets at most retry_budget more traffic from the whole
+# run, and once it is down every suite stops calling it.
+retry_policy = RetryPolicy()
+breakers = CircuitBreakers()
+
+
 class VehicleTestBase:
+    tests = ()
+    # Number of fixtures of each kind prepared for the tests.
+    fixtures = {}
+
     def __init__(self):
-        self.client = VehicleClient()
-        self.color_successful = colored("successful", "green")
-        self.color_failed = colored("failed", "red")
-        self.color_post = colored("POST", "green")
-        self.color_put = colored("PUT", "yellow")
-        self.color_delete = colored("DELETE", "red")
-        self.color_get = colored("GET", "blue")
+        # The cassette, the cache and hedging are only imported when they are turned on.
+        transport = cache = hedge = None
+        if cassette_mode is not None:
+            from cassette import get_transport
+            transport = get_transport()
+        if response_cache:
+            from cache import ResponseCache
+            cache = ResponseCache()
+        if hedge_requests:
+            from hedge import HedgePolicy
+            hedge = HedgePolicy()
+        self.client = VehicleClient(transport=transport,
+                                    cache=cache,
+                                    retry=retry_policy,
+                                    breakers=breakers,
+                                    hedge=hedge)
+        self.pool = FixturePool()
         self.test_name = 'script test'
         self.title = 'Default'
 
@@ -27,16 +56,70 @@ class VehicleTestBase:
         method = response.request.method
         code = response.code
         if not response.error:
-            print(f'{method} {url} {code}')
+            log(f'{method} {url} {code}')
             return json.loads(response.body)['msg']
-        print(f'{method} {url} {code}')
+        log(f'{method} {url} {code}')
+
+    def check(self, method, path, passed):
+        """Report whether `method path` behaved as expected."""
+
+        record_check(self.title, method, path, passed)
+
+    @exception_handler
+    async def test_all(self):
+        await self.setup()
+        for name in self.tests:
+            await getattr(self, name)()
+        await self.release()
+        await self.clear()
+
+    @exception_handler
+    async def setup(self):
+        """Create the fixtures the tests will take."""
+
+        if self.fixtures:
+            batch = await self.pool.prepare(self.fixtures)
+            log(f'[{self.title}] Prepared {batch.succeeded}/{len(batch.items)} fixtures in {batch.elapsed:.2f}s')
+
+    @exception_handler
+    async def release(self):
+        """Remove the fixtures the tests were given."""
+
+        for kind, batch in (await self.pool.release()).items():
+            for id, error in batch.failures:
+                log(f'[{self.title}] Failed to remove {kind} {id}. {error}')
+            log(f'[{self.title}] Released {batch.succeeded}/{len(batch.items)} {kind} fixtures in {batch.elapsed:.2f}s')
+
+    async def clear(self):
+        """Remove all the data created by this script."""
+
+    async def remove(self, ids, delete):
+        """Delete the given ids concurrently and report the progress and failures."""
+
+        def report(batch):
+            if batch.done % 100 == 0 and batch.done < len(ids):
+                progress(f'[{self.title}] Removed {batch.done}/{len(ids)} ({batch.rate:.1f} deletes/sec)')
+
+        batch = await self.client.bulk(delete, ids, cleanup_concurrency, report)
+        for id, error in batch.failures:
+            log(f'[{self.title}] Failed to remove {id}. {error}')
+        log(f'[{self.title}] Removed {batch.succeeded}/{len(ids)} in {batch.elapsed:.2f}s '
+              f'({batch.rate:.1f} deletes/sec), {len(batch.failures)} failed')
+        return batch
 
 
 class RouteTest(VehicleTestBase):
+    tests = ('test_post_route',
+             'test_get_route_list',
+             'test_put_route',
+             'test_delete_route')
+    fixtures = {'route': 3}
+
     def __init__(self):
         super().__init__()
         self.title = 'Route'
-        print(f'[{self.title}]')
+        self.pool.register('route', self._post_route, self.client.delete_route)
+        log(f'[{self.title}]')
 
     async def _post_route(self)->str:
         response = await self.client.post_route(self.test_name)
@@ -46,75 +129,61 @@ class RouteTest(VehicleTestBase):
     async def _get_route_list(self, id=None)->list:
         response = await self.client.get_route_list(id)
         items = self.get_msg(response)['items']
-        return items
+        return IndexedItems(items)
     
     @exception_handler
     @clear
     async def clear(self):
         """Remove all the data created by this script."""
         
-        items = await self._get_route_list()
-        for item in items:
-            if item['name'].startswith(self.test_name):
-                await self.client.delete_route(item['id'])
-    
-    @exception_handler
-    async def test_all(self):
-        await self.test_post_route()
-        await self.test_get_route_list()
-        await self.test_put_route()
-        await self.test_delete_route()
-        await self.clear()
-    
+        ids = [item.id async for item in self.client.iter_route_list(as_records=True)
+                if item.name.startswith(self.test_name)]
+        await self.remove(ids, self.client.delete_route)
+
     @exception_handler
     async def test_post_route(self):
         id = await self._post_route()
         items = await self._get_route_list(id)
-        if any(x['id']==id for x in items):
-            print(f'[{self.title}]{self.color_post}/route {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_post}/route {self.color_failed}')
+        self.check('POST', '/route', id in items)
 
     @exception_handler
     async def test_get_route_list(self):
-        id = await self._post_route()
+        id = await self.pool.shared('route')
         items = await self._get_route_list(id)
-        if any(x['id']==id for x in items):
-            print(f'[{self.title}]{self.color_get}/route/list {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_get}/route/list {self.color_failed}')
+        self.check('GET', '/route/list', id in items)
     
     @exception_handler   
     async def test_put_route(self):
-        id = await self._post_route()
+        id = await self.pool.exclusive('route')
         
         modified_name = self.get_random_name()
         await self.client.put_route(id, modified_name)
 
         items = await self._get_route_list(id)
-        if any(x['name']==modified_name for x in items):
-            print(f'[{self.title}]{self.color_put}/route {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_put}/route {self.color_failed}')
+        self.check('PUT', '/route', items.has_name(modified_name))
 
     @exception_handler
     async def test_delete_route(self):
-        id = await self._post_route()
+        id = await self.pool.exclusive('route')
         
         await self.client.delete_route(id)
 
         items = await self._get_route_list(id)
-        if not items:
-            print(f'[{self.title}]{self.color_delete}/route {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_delete}/route {self.color_failed}')   
+        self.check('DELETE', '/route', not items)
 
 
 class DriverTest(VehicleTestBase):
+    tests = ('test_post_driver',
+             'test_get_driver_list',
+             'test_put_driver',
+             'test_delete_driver')
+    fixtures = {'driver': 3}
+
     def __init__(self):
         super().__init__()
         self.title = 'Driver'
-        print(f'[{self.title}]')
+        self.pool.register('driver', self._post_driver, self.client.delete_driver)
+        log(f'[{self.title}]')
 
     async def _post_driver(self)->str:
         response = await self.client.post_driver(self.test_name)
@@ -124,101 +193,84 @@ class DriverTest(VehicleTestBase):
     async def _get_driver_list(self, id=None)->list:
         response = await self.client.get_driver_list(id)
         items = self.get_msg(response)['items']
-        return items
+        return IndexedItems(items)
     
     @exception_handler
     @clear
     async def clear(self):
         """Remove all the data created by this script."""
 
-        items = await self._get_driver_list()
-        for item in items:
-            if item['name'].startswith('script test'):
-                await self.client.delete_driver(item['id'])
-
-    @exception_handler
-    async def test_all(self):
-        await self.test_post_driver()
-        await self.test_get_driver_list()
-        await self.test_put_driver()
-        await self.test_delete_driver()
-        await self.clear()
+        ids = [item.id async for item in self.client.iter_driver_list(as_records=True)
+                if item.name.startswith('script test')]
+        await self.remove(ids, self.client.delete_driver)
 
     @exception_handler
     async def test_post_driver(self):
         id = await self._post_driver()
 
-        items = await self._get_driver_list()
-        if any(x['id']==id for x in items):
-            print(f'[{self.title}]{self.color_post}/driver {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_post}/driver {self.color_failed}')
+        items = await self._get_driver_list(id)
+        self.check('POST', '/driver', id in items)
 
     @exception_handler
     async def test_get_driver_list(self):
-        id = await self._post_driver()
+        id = await self.pool.shared('driver')
 
-        items = await self._get_driver_list()
-        if any(x['id']==id for x in items):
-            print(f'[{self.title}]{self.color_get}/driver/list {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_get}/driver/list {self.color_failed}')
+        items = await self._get_driver_list(id)
+        self.check('GET', '/driver/list', id in items)
   
     @exception_handler  
     async def test_put_driver(self):
-        id = await self._post_driver()
+        id = await self.pool.exclusive('driver')
 
         modified_name = self.get_random_name()
         await self.client.put_driver(id, modified_name)
 
-        items = await self._get_driver_list()
-        if any(x['name']==modified_name for x in items):
-            print(f'[{self.title}]{self.color_put}/driver {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_put}/driver {self.color_failed}')
+        items = await self._get_driver_list(id)
+        self.check('PUT', '/driver', items.has_name(modified_name))
 
     @exception_handler
     async def test_delete_driver(self):
-        id = await self._post_driver()
+        id = await self.pool.exclusive('driver')
         
         await self.client.delete_driver(id)
 
         items = await self._get_driver_list(id)
-        if not items:
-            print(f'[{self.title}]{self.color_delete}/driver {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_delete}/driver {self.color_failed}')   
+        self.check('DELETE', '/driver', not items)
 
 
 class DeviceTest(VehicleTestBase):
+    tests = ('test_get_device_list',)
+
     def __init__(self):
         super().__init__()
         self.title = 'Device'
-        print(f'[{self.title}]')
+        log(f'[{self.title}]')
 
     async def _get_device_list(self, id=None)->list:
         response = await self.client.get_device_list(id)
         items = self.get_msg(response)['items']
-        return items
-
-    @exception_handler
-    async def test_all(self):
-        await self.test_get_device_list()
+        return IndexedItems(items)
 
     @exception_handler
     async def test_get_device_list(self):
         items = await self._get_device_list()
-        if items != None:
-            print(f'[{self.title}]{self.color_get}/device/list {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_get}/device/list {self.color_failed}')
+        self.check('GET', '/device/list', items != None)
 
 
 class ProgramTest(VehicleTestBase):
+    tests = ('test_post_program',
+             'test_get_program',
+             'test_get_program_list',
+             'test_get_program_search',
+             'test_put_program',
+             'test_delete_program')
+    fixtures = {'program': 3}
+
     def __init__(self):
         super().__init__()
         self.title = 'Program'
-        print(f'[{self.title}]')
+        self.pool.register('program', self._post_program, self.client.delete_program)
+        log(f'[{self.title}]')
 
     async def _post_program(self)->str:
         response = await self.client.post_program(self.get_random_name())
@@ -228,7 +280,7 @@ class ProgramTest(VehicleTestBase):
     async def _get_program_list(self, id=None)->list:
         response = await self.client.get_program_list(id)
         programs = self.get_msg(response)
-        return programs
+        return IndexedItems(programs)
 
     @exception_handler
     @clear
@@ -236,268 +288,287 @@ class ProgramTest(VehicleTestBase):
         """Remove all the data created by this script."""
 
         items = await self._get_program_list()
-        for item in items:
-            if item['name'].startswith('script test'):
-                await self.client.delete_program(item['id'])
-
-    @exception_handler
-    async def test_all(self):
-        await self.test_post_program()
-        await self.test_get_program()
-        await self.test_get_program_list()
-        await self.test_get_program_search()
-        await self.test_put_program()
-        await self.test_delete_program()
-        await self.clear()
+        ids = [item['id'] for item in items.with_prefix(self.test_name)]
+        await self.remove(ids, self.client.delete_program)
 
     @exception_handler
     async def test_post_program(self):
         id = await self._post_program()
 
         items = await self._get_program_list(id)
-        if any(x['id']==id for x in items):
-            print(f'[{self.title}]{self.color_post}/program {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_post}/program {self.color_failed}')
+        self.check('POST', '/program', id in items)
 
     @exception_handler
     async def test_get_program(self):
-        id = await self._post_program()
+        id = await self.pool.shared('program')
 
         response = await self.client.get_program(id)
         item = self.get_msg(response)
-        if item['id']==id:
-            print(f'[{self.title}]{self.color_get}/program {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_get}/program {self.color_failed}')
+        self.check('GET', '/program', item['id']==id)
     
     @exception_handler
     async def test_get_program_list(self):
-        id = await self._post_program()
+        id = await self.pool.shared('program')
 
         items = await self._get_program_list(id)
-        if any(x['id']==id for x in items):
-            print(f'[{self.title}]{self.color_get}/program/list {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_get}/program/list {self.color_failed}')
+        self.check('GET', '/program/list', id in items)
     
     @exception_handler
     async def test_get_program_search(self):
-        id = await self._post_program()
+        id = await self.pool.shared('program')
 
         response = await self.client.get_program_search(id)
-        items = self.get_msg(response)
-        if any(x['id']==id for x in items):
-            print(f'[{self.title}]{self.color_get}/program/search {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_get}/program/search {self.color_failed}')
+        items = IndexedItems(self.get_msg(response))
+        self.check('GET', '/program/search', id in items)
     
     @exception_handler
     async def test_put_program(self):
-        id = await self._post_program()
+        id = await self.pool.exclusive('program')
 
         modified_name = self.get_random_name()
         await self.client.put_program(id, modified_name)
 
         items = await self._get_program_list(id)
-        if any(x['name']==modified_name for x in items):
-            print(f'[{self.title}]{self.color_put}/program {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_put}/program {self.color_failed}')
+        self.check('PUT', '/program', items.has_name(modified_name))
 
     @exception_handler
     async def test_delete_program(self):
-        id = await self._post_program()
+        id = await self.pool.exclusive('program')
         
         await self.client.delete_program(id)
 
         items = await self._get_program_list(id)
-        if any(x['id']!=id for x in items):
-            print(f'[{self.title}]{self.color_delete}/program {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_delete}/program {self.color_failed}')   
+        self.check('DELETE', '/program', id not in items)
     
 
 class VehicleTest(VehicleTestBase):
+    tests = ('test_post_item',
+             'test_get_list',
+             'test_get_list_by_device',
+             'test_put_item',
+             'test_put_program_link',
+             'test_delete_item')
+    fixtures = {'item': 4, 'program': 1}
+
     def __init__(self):
         super().__init__()
         self.title = 'Vehicle'
-        print(f'[{self.title}]')
+        self.pool.register('item', self._post_item, self.client.delete_item, key=lambda item: item[0])
+        self.pool.register('program', self._post_program, self.client.delete_program)
+        log(f'[{self.title}]')
 
     async def _post_item(self)->str:
         response = await self.client.post_item(self.test_name)
         msg = self.get_msg(response)
         return msg['id'], msg['device_mac']
+
+    async def _post_program(self)->str:
+        response = await self.client.post_program(self.get_random_name())
+        id = self.get_msg(response)['id']
+        return id
     
     async def _get_list(self, id=None)->list:
         response = await self.client.get_list(id)
         items = self.get_msg(response)['items']
-        return items
+        return IndexedItems(items)
      
     @exception_handler 
     @clear
     async def clear(self):
         """Remove all the data created by this script."""
 
-        items = await self._get_list()
-        for item in items:
-            if item['name'].startswith('script test'):
-                await self.client.delete_item(item['id'])
+        ids = [item.id async for item in self.client.iter_list(as_records=True)
+                if item.name.startswith('script test')]
+        await self.remove(ids, self.client.delete_item)
      
-    @exception_handler
-    async def test_all(self):
-        await self.test_post_item()
-        await self.test_get_list()
-        await self.test_get_list_by_device()
-        await self.test_put_item()
-        await self.test_put_program_link()
-        await self.test_delete_item()
-        await self.clear()
-
     @exception_handler
     async def test_post_item(self):
         id, device_id = await self._post_item()
 
         items = await self._get_list(id)
-        if any(x['id']==id for x in items):
-            print(f'[{self.title}]{self.color_post}/item {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_post}/item {self.color_failed}')
+        self.check('POST', '/item', id in items)
 
     @exception_handler
     async def test_get_list(self):
-        id, device_id = await self._post_item()
+        id, device_id = await self.pool.shared('item')
 
         items = await self._get_list(id)
-        if any(x['id']==id for x in items):
-            print(f'[{self.title}]{self.color_get}/item {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_get}/item {self.color_failed}')
+        self.check('GET', '/item', id in items)
 
     @exception_handler
     async def test_get_list_by_device(self):
-        id, device_id = await self._post_item()
+        id, device_id = await self.pool.shared('item')
 
         response = await self.client.get_list_by_device(device_id)
-        items = self.get_msg(response)['lileesystems']
-        if any(x['id']==id for x in items):
-            print(f'[{self.title}]{self.color_get}/list/by_device {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_get}/list/by_device {self.color_failed}')
+        items = IndexedItems(self.get_msg(response)['lileesystems'])
+        self.check('GET', '/list/by_device', id in items)
 
     @exception_handler
     async def test_put_item(self):
-        id, device_id = await self._post_item()
+        id, device_id = await self.pool.exclusive('item')
 
         modified_name = self.get_random_name()
         await self.client.put_item(id, device_id, modified_name)
 
         items = await self._get_list(id)
-        if any(x['name']==modified_name for x in items):
-            print(f'[{self.title}]{self.color_put}/item {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_put}/item {self.color_failed}')
+        self.check('PUT', '/item', items.has_name(modified_name))
 
     @exception_handler
     async def test_delete_item(self):
-        id, device_id = await self._post_item()
+        id, device_id = await self.pool.exclusive('item')
         
         await self.client.delete_item(id)
 
         items = await self._get_list(id)
-        if any(x['id']!=id for x in items):
-            print(f'[{self.title}]{self.color_delete}/item {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_delete}/item {self.color_failed}')   
+        self.check('DELETE', '/item', id not in items)
 
     @exception_handler
     async def test_put_program_link(self):
-        response = await self.client.post_program(self.get_random_name())
-        program_id = self.get_msg(response)['id']
-        vehicle_id, device_id = await self._post_item()
+        program_id = await self.pool.exclusive('program')
+        vehicle_id, device_id = await self.pool.exclusive('item')
 
         await self.client.put_program_link(vehicle_id, program_id)
 
-        response = await self.client.get_list(program_id=program_id)
-        items = self.get_msg(response)['items']
-        if any(x['id']==vehicle_id for x in items):
-            print(f'[{self.title}]{self.color_put}/program/link {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_put}/program/link {self.color_failed}')
+        response = await self.client.get_list(vehicle_id, program_id=program_id)
+        items = IndexedItems(self.get_msg(response)['items'])
+        self.check('PUT', '/program/link', vehicle_id in items)
 
 
 class EventTest(VehicleTestBase):
+    tests = ('test_get_event_list',
+             'test_get_event_list_chunked')
+
     def __init__(self):
         super().__init__()
         self.title = 'Event'
-        print(f'[{self.title}]')
-
-    @exception_handler
-    async def test_all(self):
-        await self.test_get_event_list()
+        log(f'[{self.title}]')
 
     @exception_handler
     async def test_get_event_list(self):
         response = await self.client.get_event_list(start = '1585149293',end = '1585149293000')
         items = self.get_msg(response)['list']
-        if items:
-            print(f'[{self.title}]{self.color_get}/event/list {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_get}/event/list {self.color_failed}')
+        self.check('GET', '/event/list', items)
+
+    @exception_handler
+    async def test_get_event_list_chunked(self):
+        start, end = 1585149293, 1585149293 + 3 * 86400
+        response = await self.client.get_event_list(start, end)
+        items = self.get_msg(response)['list']
+
+        msg = await self.client.get_event_list_chunked(start, end, window=3600)
+        self.check('GET', '/event/list in windows', sorted(x['id'] for x in msg['list']) == sorted(x['id'] for x in items))
         
 
 class TelematicTest(VehicleTestBase):
+    tests = ('test_get_telematic',
+             'test_get_telematic_chunked')
+
     def __init__(self):
         super().__init__()
         self.title = 'Telematic'
-        print(f'[{self.title}]')
-
-    @exception_handler
-    async def test_all(self):
-        await self.test_get_telematic()
+        log(f'[{self.title}]')
 
     @exception_handler
     async def test_get_telematic(self):
         response = await self.client.get_telematic()
         item = self.get_msg(response)
-        if item:
-            print(f'[{self.title}]{self.color_get}/telematic {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_get}/telematic {self.color_failed}')
+        self.check('GET', '/telematic', item)
+
+    @exception_handler
+    async def test_get_telematic_chunked(self):
+        start, end = 1585440000, 1585440000 + 30 * 86400
+        response = await self.client.get_telematic(start=start, end=end,
+                                                    chart_granularity=3600, map_granularity=3600)
+        item = self.get_msg(response)
+
+        msg = await self.client.get_telematic_chunked(start=start, end=end,
+                                                      chart_granularity=3600, map_granularity=3600)
+        self.check('GET', '/telematic in windows', msg == item)
 
 
 class RealtimeTest(VehicleTestBase):
+    tests = ('test_post_realtime',
+             'test_poll_realtime')
+
     def __init__(self):
         super().__init__()
         self.title = 'Realtime'
-        print(f'[{self.title}]')
-
-    @exception_handler
-    async def test_all(self):
-        await self.test_post_realtime()
+        log(f'[{self.title}]')
 
     @exception_handler
     async def test_post_realtime(self):
         response = await self.client.post_realtime()
         item = self.get_msg(response)
-        if item:
-            print(f'[{self.title}]{self.color_post}/realtime {self.color_successful}')
-            return
-        print(f'[{self.title}]{self.color_post}/realtime {self.color_failed}')
+        self.check('POST', '/realtime', item)
+
+    @exception_handler
+    async def test_poll_realtime(self):
+        from realtime import RealtimePoller
+
+        poller = RealtimePoller(self.client, [telematic_vehicle_id], interval=0)
+        changes = [changes async for changes in poller.watch(polls=2)]
+        self.check('POST', '/realtime polling', poller.failures == 0 and changes and telematic_vehicle_id in changes[0])
+
+
+async def main(suites=None, monitor=None):
+    """Run the given suite classes, or the ones listed here, and print their reports.
 
+    A profiling.LoopMonitor given as `monitor` measures the run and its report is printed too.
+    """
 
-async def main():
     print('The test of the vehicle APIs is starting...')
 
     try:
-        # await RouteTest().test_all()
-        # await DriverTest().test_all()
-        # await DeviceTest().test_all()
-        # await ProgramTest().test_all()
-        # await VehicleTest().test_all()
-        await EventTest().test_all()
-        await TelematicTest().test_all()
-        await RealtimeTest().test_all()
+        if suites is None:
+            suites = [
+                # RouteTest,
+                # DriverTest,
+                # DeviceTest,
+                # ProgramTest,
+                # VehicleTest,
+                EventTest,
+                TelematicTest,
+                RealtimeTest,
+            ]
+        suites = [suite() for suite in suites]
+        runner = Runner(monitor=monitor)
+        await runner.run(suites)
+        if cassette_mode is not None:
+            from cassette import save_cassette
+            save_cassette()
+        if report_jsonl is not None:
+            runner.reporter.write_jsonl(report_jsonl)
+        if report_junit is not None:
+            runner.reporter.write_junit(report_junit)
+        for suite in suites:
+            stats = suite.client.transport.stats()
+            print(f"[{suite.title}] requests: {stats['requests']}, "
+                  f"peak active: {stats['peak_active']}/{stats['max_clients']}, "
+                  f"peak queued: {stats['peak_queued']}, "
+                  f"queue wait avg/max: {stats['avg_queue_wait'] * 1000:.1f}/{stats['max_queue_wait'] * 1000:.1f} ms")
+            if suite.client.hedge is not None:
+                stats = suite.client.hedge.stats()
+                print(f"[{suite.title}] hedges fired: {stats['fired']}, won: {stats['won']}, "
+                      f"capped: {stats['capped']}")
+            if suite.client.cache is not None:
+                stats = suite.client.cache.stats()
+                print(f"[{suite.title}] cache hits: {stats['hits']}, misses: {stats['misses']}, "
+                      f"invalidations: {stats['invalidations']}")
+        stats = retry_policy.stats()
+        if stats['retries'] or stats['budget_exhausted']:
+            print(f"Retries: {stats['retries']} (amplification {stats['amplification']:.2f}x), "
+                  f"budget exhausted: {stats['budget_exhausted']}, gave up: {stats['gave_up']}")
+        for name, breaker in breakers.stats().items():
+            if breaker['rejected'] or breaker['state'] != 'closed':
+                print(f"Circuit of {name}: {breaker['state']}, rejected {breaker['rejected']} calls")
+
+        metrics = EndpointMetrics()
+        for suite in suites:
+            metrics.merge(suite.client.metrics)
+        metrics.print_report()
+        if monitor is not None:
+            monitor.print_report()
+        runner.reporter.print_summary()
     except Exception as e:
         print(f'An exceptional error ocurred in main. {e}')
 
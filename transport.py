@@ -0,0 +1,94 @@
+from tornado.httpclient import HTTPRequest, HTTPResponse, HTTPError
+from config import http_backend, max_clients, keep_alive, connect_timeout, request_timeout
+import asyncio
+import time
+
+
+class Transport:
+    """The HTTP connection pool behind a VehicleClient.
+
+    Requests wait for one of `max_clients` slots before they are handed to
+    tornado, so the queueing that tornado would otherwise do invisibly is
+    counted here. The 'curl' backend needs pycurl and reuses connections
+    when `keep_alive` is on; tornado's 'simple' backend always opens a new
+    connection per request.
+    """
+
+    def __init__(self, max_clients=max_clients, backend=http_backend, keep_alive=keep_alive,
+                 connect_timeout=connect_timeout, request_timeout=request_timeout):
+        if backend == 'curl':
+            from tornado.curl_httpclient import CurlAsyncHTTPClient as client_class
+        elif backend == 'simple':
+            from tornado.simple_httpclient import SimpleAsyncHTTPClient as client_class
+        else:
+            raise ValueError(f'Unknown HTTP backend {backend!r}.')
+
+        self.backend = backend
+        self.max_clients = max_clients
+        self.keep_alive = keep_alive
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self.http_client = client_class(force_instance=True, max_clients=max_clients)
+        self.slots = asyncio.Semaphore(max_clients)
+        self.requests = 0
+        self.queued = 0
+        self.active = 0
+        self.peak_queued = 0
+        self.peak_active = 0
+        self.queue_wait = 0.0
+        self.max_queue_wait = 0.0
+
+    async def fetch(self, url, **kwargs)->HTTPResponse:
+        """Send a request and return its response, with code 599 for any transport error."""
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        if not self.keep_alive:
+            headers['Connection'] = 'close'
+        request = HTTPRequest(url,
+                            headers=headers,
+                            connect_timeout=self.connect_timeout,
+                            request_timeout=self.request_timeout,
+                            **kwargs)
+
+        queued_at = time.monotonic()
+        self.queued += 1
+        self.peak_queued = max(self.peak_queued, self.queued)
+        try:
+            await self.slots.acquire()
+        finally:
+            self.queued -= 1
+
+        wait = time.monotonic() - queued_at
+        self.requests += 1
+        self.queue_wait += wait
+        self.max_queue_wait = max(self.max_queue_wait, wait)
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+        started = time.monotonic()
+        try:
+            return await self.http_client.fetch(request, raise_error=False)
+        except (HTTPError, OSError) as e:
+            # Newer tornado raises timeouts and connection errors even with
+            # raise_error=False; hand them back the way tornado 5 does.
+            if getattr(e, 'response', None) is not None:
+                return e.response
+            return HTTPResponse(request, 599, error=e, request_time=time.monotonic() - started)
+        finally:
+            self.active -= 1
+            self.slots.release()
+
+    def stats(self)->dict:
+        """Return the pool statistics collected so far."""
+
+        return {'backend': self.backend,
+                'max_clients': self.max_clients,
+                'requests': self.requests,
+                'queued': self.queued,
+                'active': self.active,
+                'peak_queued': self.peak_queued,
+                'peak_active': self.peak_active,
+                'avg_queue_wait': self.queue_wait / self.requests if self.requests else 0.0,
+                'max_queue_wait': self.max_queue_wait}
+
+    def close(self):
+        self.http_client.close()
@@ -1,67 +1,463 @@
-from tornado.httpclient import AsyncHTTPClient
-from config import auth_user, auth_entry_point, vehicle_entry_point
+from transport import Transport
+from metrics import EndpointMetrics
+from retry import RetryPolicy
+from breaker import CircuitBreakers
+from streaming import ItemStreamParser
+from records import Route, Driver, Vehicle, Device
+from batch import run_batch, response_error
+from config import auth_user, list_page_size, token_refresh_margin, token_attempts, bulk_concurrency
+from config import retry_base_delay, retry_max_delay
+from config import telematic_vehicle_id, telematic_window, event_window, window_concurrency, realtime_fields
 from functools import wraps
+from urllib.parse import urlsplit
 from decorator import exception_handler
+from reporter import log, error, count_request
+import config
 import asyncio
+import base64
 import json
+import math
+import time
 import uuid
 
 
+def get_token_expiry(token):
+    """Return the expiry claim of a JWT access token, or None if it has none."""
+
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except Exception:
+        return None
+
+
+def split_range(start, end, window, step=1, inclusive=False)->list:
+    """Split start..end into consecutive (start, end) windows of at most `window` seconds.
+
+    Windows are a multiple of `step` long, so the buckets of a granularity
+    fall on the same times as in a single request. With `inclusive` the end
+    of a window is part of it, as with the event list.
+    """
+
+    start, end = int(start), int(end)
+    window = max(step, window // step * step)
+    windows = []
+    for window_start in range(start, end + 1 if inclusive else end, window):
+        window_end = window_start + window
+        windows.append((window_start, min(window_end - 1, end) if inclusive else min(window_end, end)))
+    return windows or [(start, end)]
+
+
+def merge_windows(msgs, path='msg')->dict:
+    """Merge the msg of consecutive windows, joining their lists in order.
+
+    Objects are merged key by key the same way. Any other value has to be
+    the same in every window, as a total or a count over the whole range
+    cannot be told from the ones of its windows, so a ValueError is raised
+    when they differ.
+    """
+
+    merged = {}
+    for msg in msgs:
+        for key, value in msg.items():
+            if key not in merged:
+                merged[key] = merge_windows([value], f'{path}.{key}') if isinstance(value, dict) else value
+                continue
+            previous = merged[key]
+            if isinstance(value, list) and isinstance(previous, list):
+                merged[key] = previous + value
+            elif isinstance(value, dict) and isinstance(previous, dict):
+                merged[key] = merge_windows([previous, value], f'{path}.{key}')
+            elif previous != value:
+                raise ValueError(f'Cannot merge {path}.{key} of the windows, {previous!r} != {value!r}.')
+    return merged
+
+
+class TokenError(RuntimeError):
+    """Raised instead of sending a request when no access token could be got."""
+
+
 class VehicleClient:
-    def __init__(self):
-        self.entry_point = vehicle_entry_point
+    def __init__(self, transport=None, cache=None, retry=None, breakers=None, hedge=None):
+        self.entry_point = config.vehicle_entry_point
+        self.auth_entry_point = config.auth_entry_point
         self.headers = {'accept':'application/json',
                         'Authorization': None,
                         'Content-Type': 'application/json'}
-        self.http_client = AsyncHTTPClient()
+        self.transport = transport or Transport()
+        self.metrics = EndpointMetrics()
+        self.cache = cache
+        self.retry = retry or RetryPolicy()
+        self.breakers = breakers or CircuitBreakers()
+        self.hedge = hedge
+        self.token_expires_at = None
+        self._token_refresh = None
 
     async def get_token(self):
         """Get the access token from Alpha."""
 
         try:
-            api_endpoint = auth_entry_point
+            api_endpoint = self.auth_entry_point
 
             headers = {'X-TCLOUD-SERVICE': 'fm',
                         'Content-Type': 'application/json'}
 
             body = json.dumps(auth_user)
 
-            response = await self.http_client.fetch(api_endpoint,
-                                            raise_error=False,
-                                            method='POST',
-                                            body=body,
-                                            headers=headers)
+            started = time.monotonic()
+            response = await self.transport.fetch(api_endpoint,
+                                                method='POST',
+                                                body=body,
+                                                headers=headers)
+            self.metrics.record('POST auth/token', response.code, time.monotonic() - started)
             if response.error is None:
-                token = f"Bearer {json.loads(response.body)['msg']['v3']['access_token']}"
-                self.headers['Authorization'] = token
-                print(f'Getting token successful.')
+                access_token = json.loads(response.body)['msg']['v3']['access_token']
+                # Swap in a new dict so requests being sent keep a consistent set of headers.
+                self.headers = dict(self.headers, Authorization=f'Bearer {access_token}')
+                self.token_expires_at = get_token_expiry(access_token)
+                log(f'Getting token successful.')
+                return True
             else:
-                print(f'Getting token failed.')
+                log(f'Getting token failed.')
 
         except Exception as e:
-            print(f'An error occurred while getting token {e}')
+            error(f'An error occurred while getting token {e}')
+        return False
+
+    async def get_token_retrying(self):
+        """get_token(), tried again with a backoff while it fails, at most token_attempts times."""
+
+        for attempt in range(token_attempts):
+            if attempt:
+                await asyncio.sleep(min(retry_max_delay, retry_base_delay * 2 ** (attempt - 1)))
+            if await self.get_token():
+                return
+
+    async def refresh_token(self):
+        """Get a new token, sharing one request among all the concurrent callers."""
+
+        if self._token_refresh is None:
+            self._token_refresh = asyncio.ensure_future(self.get_token_retrying())
+            self._token_refresh.add_done_callback(self._token_refreshed)
+        await asyncio.shield(self._token_refresh)
+
+    def _token_refreshed(self, future):
+        self._token_refresh = None
+
+    async def ensure_token(self):
+        """Make sure there is a token that has not expired.
+
+        A token that is about to expire is refreshed in the background while it
+        is still used, so only a missing or expired token makes the caller wait.
+        Raises TokenError when there is no token at all, so no request is sent
+        without one.
+        """
+
+        if self.headers['Authorization'] is None:
+            await self.refresh_token()
+            if self.headers['Authorization'] is None:
+                raise TokenError('There is no access token, getting one failed.')
+        elif self.token_expires_at is not None:
+            remaining = self.token_expires_at - time.time()
+            if remaining <= 0:
+                await self.refresh_token()
+            elif remaining <= token_refresh_margin and self._token_refresh is None:
+                asyncio.ensure_future(self.refresh_token())
 
     async def auth_promise_fetch(self, fetch):
+        await self.ensure_token()
+        authorization = self.headers['Authorization']
         response = await fetch()
-        if response.code in (401, 599):
-                await self.get_token()
-                return await fetch()
+        if response.code == 401:
+            # Only refresh when no one else did it since this request was sent.
+            if self.headers['Authorization'] == authorization:
+                await self.refresh_token()
+            return await fetch()
         return response
+
+    async def request(self, method, api_endpoint, body=None):
+        """Send a request to the vehicle service with the current token."""
+
+        path = self.get_path(api_endpoint)
+        if self.cache is not None:
+            if method == 'GET':
+                response = self.cache.get(api_endpoint, path)
+                if response is not None:
+                    return response
+                generation = self.cache.generation(path)
+            else:
+                self.cache.invalidate(path)
+
+        count_request()
+        breakers = (self.breakers.get(f'{method} {path}'), self.breakers.host(urlsplit(api_endpoint).netloc))
+
+        async def fetch():
+            self.breakers.before_call(breakers)
+            try:
+                response = await self.transport.fetch(api_endpoint,
+                                                    method=method,
+                                                    body=body,
+                                                    headers=self.headers)
+            except BaseException:
+                # A cancelled call or an error of this process, not an answer of the
+                # service: the transport returns network errors as 599 responses.
+                for breaker in breakers:
+                    breaker.cancelled()
+                raise
+            for breaker in breakers:
+                breaker.record(response.code >= 500)
+            return response
+
+        send = lambda: self.auth_promise_fetch(fetch)
+        if method == 'GET' and self.hedge is not None:
+            latencies = self.metrics.latencies.get(f'{method} {path}')
+            send = lambda: self.hedge.send(latencies, lambda: self.auth_promise_fetch(fetch))
+
+        started = time.monotonic()
+        response = await self.retry.send(method, send)
+        self.metrics.record(f'{method} {path}', response.code, time.monotonic() - started)
+
+        if self.cache is not None:
+            if method != 'GET':
+                self.cache.invalidate(path)
+            elif response.code == 200:
+                self.cache.put(api_endpoint, path, response, generation)
+        return response
+
+    def get_path(self, api_endpoint)->str:
+        """Return the path of a request below the entry point, e.g. 'route/list'."""
+
+        if api_endpoint.startswith(self.entry_point):
+            api_endpoint = api_endpoint[len(self.entry_point):]
+        return api_endpoint.split('?', 1)[0]
+
+    async def bulk(self, operation, items, concurrency=bulk_concurrency, progress=None):
+        """Await `operation(item)` for every item with at most `concurrency` in flight.
+
+        The token is checked once before the batch starts, so all the calls
+        share it instead of racing to get one. Returns the BatchResult, with
+        the responses in the order of `items`.
+        """
+
+        await self.ensure_token()
+        return await run_batch(operation, items, concurrency, response_error, progress)
+
+    async def bulk_post_route(self, names, concurrency=bulk_concurrency, progress=None):
+        return await self.bulk(self.post_route, names, concurrency, progress)
+
+    async def bulk_delete_route(self, ids, concurrency=bulk_concurrency, progress=None):
+        return await self.bulk(self.delete_route, ids, concurrency, progress)
+
+    async def bulk_post_driver(self, names, concurrency=bulk_concurrency, progress=None):
+        return await self.bulk(self.post_driver, names, concurrency, progress)
+
+    async def bulk_delete_driver(self, ids, concurrency=bulk_concurrency, progress=None):
+        return await self.bulk(self.delete_driver, ids, concurrency, progress)
+
+    async def bulk_post_program(self, names, concurrency=bulk_concurrency, progress=None):
+        return await self.bulk(self.post_program, names, concurrency, progress)
+
+    async def bulk_delete_program(self, ids, concurrency=bulk_concurrency, progress=None):
+        return await self.bulk(self.delete_program, ids, concurrency, progress)
+
+    async def bulk_post_item(self, names, concurrency=bulk_concurrency, progress=None):
+        return await self.bulk(self.post_item, names, concurrency, progress)
+
+    async def bulk_delete_item(self, ids, concurrency=bulk_concurrency, progress=None):
+        return await self.bulk(self.delete_item, ids, concurrency, progress)
+
+    async def get_windows(self, get_window, windows)->dict:
+        """Request `get_window(start, end)` for every window concurrently and merge the msg in order."""
+
+        batch = await run_batch(lambda window: get_window(*window), windows, window_concurrency, response_error)
+        if batch.failures:
+            (start, end), error = batch.failures[0]
+            raise RuntimeError(f'The window {start}..{end} failed. {error}')
+        return merge_windows(json.loads(response.body)['msg'] for response in batch.results)
+
+    async def iter_windows(self, get_window, windows):
+        """Yield (window, msg) for every window as it arrives, requesting them concurrently."""
+
+        semaphore = asyncio.Semaphore(window_concurrency)
+
+        async def fetch(window):
+            async with semaphore:
+                return window, await get_window(*window)
+
+        tasks = [asyncio.ensure_future(fetch(window)) for window in windows]
+        try:
+            for next_window in asyncio.as_completed(tasks):
+                (start, end), response = await next_window
+                if response is None:
+                    raise RuntimeError(f'The window {start}..{end} failed.')
+                response.rethrow()
+                yield (start, end), json.loads(response.body)['msg']
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def iter_pages(self, get_page, page_size=list_page_size, record_type=None, keep_raw=False):
+        """Yield the items of a list endpoint one page at a time.
+
+        `get_page(offset, count)` requests one page. The next page is already
+        on its way while the caller consumes the current one, and paging stops
+        at the first page that comes back empty. A shorter page does not end
+        the list, as the service may return fewer than `page_size` items per
+        page, so the last page costs one more request. With a `record_type`
+        the items are yielded as records of that type.
+        """
+
+        offset = 0
+        next_page = asyncio.ensure_future(get_page(offset, page_size))
+        try:
+            while next_page is not None:
+                response = await next_page
+                if response is None:
+                    raise RuntimeError(f'Listing failed at offset {offset}.')
+                response.rethrow()
+                items = json.loads(response.body)['msg']['items']
+                offset += len(items)
+                next_page = None
+                if items:
+                    next_page = asyncio.ensure_future(get_page(offset, page_size))
+                if record_type is not None:
+                    items = [record_type.from_dict(item, keep_raw) for item in items]
+                for item in items:
+                    yield item
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    def iter_route_list(self, page_size=list_page_size, as_records=False, keep_raw=False):
+        """Iterate over all the routes by default filter."""
+
+        return self.iter_pages(lambda offset, count: self.get_route_list(offset=offset, count=count),
+                                page_size,
+                                Route if as_records else None,
+                                keep_raw)
+
+    def iter_driver_list(self, page_size=list_page_size, as_records=False, keep_raw=False):
+        """Iterate over all the drivers by default filter."""
+
+        return self.iter_pages(lambda offset, count: self.get_driver_list(offset=offset, count=count),
+                                page_size,
+                                Driver if as_records else None,
+                                keep_raw)
+
+    def iter_list(self, program_id=None, page_size=list_page_size, as_records=False, keep_raw=False):
+        """Iterate over all the vehicles by default filter."""
+
+        return self.iter_pages(lambda offset, count: self.get_list(program_id=program_id,
+                                                                    offset=offset,
+                                                                    count=count),
+                                page_size,
+                                Vehicle if as_records else None,
+                                keep_raw)
+
+    def iter_device_list(self, page_size=list_page_size, as_records=False, keep_raw=False):
+        """Iterate over all the devices by default filter."""
+
+        return self.iter_pages(lambda offset, count: self.get_device_list(offset=offset, count=count),
+                                page_size,
+                                Device if as_records else None,
+                                keep_raw)
     
+    async def stream_items(self, api_endpoint, path=('msg', 'items'), record_type=None, keep_raw=False):
+        """Yield the elements of a list response while its body is still arriving.
+
+        The chunks of the body that tornado's streaming_callback hands over
+        are queued as they are and fed to an ItemStreamParser only as the
+        caller asks for elements, so what waits for a slow caller is
+        undecoded bytes and never the decoded list. Leaving the loop early
+        stops the download. With a `record_type` the elements are yielded as
+        records of that type.
+        """
+
+        await self.ensure_token()
+        for attempt in range(2):
+            authorization = self.headers['Authorization']
+            parser = ItemStreamParser(path)
+            chunks = asyncio.Queue()
+            status = {}
+            finished = object()
+            stopped = False
+
+            def header_callback(line):
+                if line.startswith('HTTP/'):
+                    status['code'] = int(line.split()[1])
+
+            def streaming_callback(chunk):
+                if stopped:
+                    raise RuntimeError('The stream was closed by the caller.')
+                if status.get('code') == 200:
+                    chunks.put_nowait(chunk)
+
+            started = time.monotonic()
+            fetch = asyncio.ensure_future(self.transport.fetch(api_endpoint,
+                                                            method='GET',
+                                                            headers=self.headers,
+                                                            header_callback=header_callback,
+                                                            streaming_callback=streaming_callback))
+            fetch.add_done_callback(lambda future: chunks.put_nowait(finished))
+            try:
+                while True:
+                    chunk = await chunks.get()
+                    if chunk is finished:
+                        break
+                    for item in parser.feed(chunk):
+                        if record_type is not None:
+                            item = record_type.from_dict(item, keep_raw)
+                        yield item
+            finally:
+                stopped = True
+
+            response = fetch.result()
+            self.metrics.record(f'GET {self.get_path(api_endpoint)}', response.code, time.monotonic() - started)
+            if response.code == 401 and attempt == 0:
+                if self.headers['Authorization'] == authorization:
+                    await self.refresh_token()
+                continue
+            response.rethrow()
+            parser.close()
+            return
+
+    def stream_route_list(self, id=None, count=10000, as_records=False, keep_raw=False):
+        """Stream the routes by default filter."""
+
+        return self.stream_items(self.get_route_list_endpoint(id, count=count),
+                                record_type=Route if as_records else None,
+                                keep_raw=keep_raw)
+
+    def stream_driver_list(self, id=None, count=10000, as_records=False, keep_raw=False):
+        """Stream the drivers by default filter."""
+
+        return self.stream_items(self.get_driver_list_endpoint(id, count=count),
+                                record_type=Driver if as_records else None,
+                                keep_raw=keep_raw)
+
+    def stream_list(self, program_id=None, count=1000, as_records=False, keep_raw=False):
+        """Stream the vehicles by default filter."""
+
+        return self.stream_items(self.get_list_endpoint(program_id=program_id, count=count),
+                                record_type=Vehicle if as_records else None,
+                                keep_raw=keep_raw)
+
+    def stream_device_list(self, count=1000, as_records=False, keep_raw=False):
+        """Stream the devices by default filter."""
+
+        return self.stream_items(self.get_device_list_endpoint(count=count),
+                                record_type=Device if as_records else None,
+                                keep_raw=keep_raw)
+
     @exception_handler
     async def post_route(self, name):
         """Create a route and return the created id."""
         
         api_endpoint = f'{self.entry_point}route'
         body = json.dumps({"name": name})
-        method = 'POST'
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method=method,
-                                        body=body,
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+
+        return await self.request('POST', api_endpoint, body)
 
     @exception_handler
     async def put_route(self, id, name):
@@ -70,27 +466,20 @@ class VehicleClient:
         api_endpoint = f'{self.entry_point}route?id={id}'
         body = json.dumps({"name": name})
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                            raise_error=False,
-                                            method='PUT',
-                                            body=body,
-                                            headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('PUT', api_endpoint, body)
     
+    def get_route_list_endpoint(self, id=None, offset=0, count=10000)->str:
+        api_endpoint = f'{self.entry_point}route/list?org_name=lileesystems&offset={offset}&count={count}'
+        if id is not None:
+            api_endpoint += f'&search_id={id}'
+        return api_endpoint
+
     @exception_handler
-    async def get_route_list(self, id=None)-> list:
+    async def get_route_list(self, id=None, offset=0, count=10000)-> list:
         """List routes by default filter."""
 
-        api_endpoint = f'{self.entry_point}route/list?org_name=lileesystems&offset=0&count=10000'
-        if id is not None:
-            api_endpoint += f'&search_id={id}'
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                            raise_error=False,
-                                            method='GET',
-                                            headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        api_endpoint = self.get_route_list_endpoint(id, offset, count)
+        return await self.request('GET', api_endpoint)
 
     @exception_handler
     async def delete_route(self, id):
@@ -98,12 +487,7 @@ class VehicleClient:
 
         api_endpoint = f'{self.entry_point}route?id={id}'
         
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='DELETE',
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)               
+        return await self.request('DELETE', api_endpoint)
         
     @exception_handler
     async def post_driver(self, name)-> str:
@@ -112,14 +496,7 @@ class VehicleClient:
         api_endpoint = f'{self.entry_point}driver'
         body = json.dumps({"name": name})
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='POST',
-                                        body=body,
-                                        headers=self.headers)
-
-        return await self.auth_promise_fetch(fetch) 
+        return await self.request('POST', api_endpoint, body)
 
     @exception_handler
     async def put_driver(self, id, name):
@@ -128,27 +505,20 @@ class VehicleClient:
         api_endpoint = f'{self.entry_point}driver?id={id}'
         body = json.dumps({"name": name})
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='PUT',
-                                        body=body,
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch) 
+        return await self.request('PUT', api_endpoint, body)
+
+    def get_driver_list_endpoint(self, id=None, offset=0, count=10000)->str:
+        api_endpoint = f'{self.entry_point}driver/list?org_name=lileesystems&offset={offset}&count={count}'
+        if id is not None:
+            api_endpoint += f'&search_id={id}'
+        return api_endpoint
 
     @exception_handler
-    async def get_driver_list(self, id=None)-> list:
+    async def get_driver_list(self, id=None, offset=0, count=10000)-> list:
         """List drivers by default filter."""
 
-        api_endpoint = f'{self.entry_point}driver/list?org_name=lileesystems&offset=0&count=10000'
-        if id is not None:
-            api_endpoint += f'&search_id={id}'
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='GET',
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        api_endpoint = self.get_driver_list_endpoint(id, offset, count)
+        return await self.request('GET', api_endpoint)
 
     @exception_handler
     async def delete_driver(self, id):
@@ -156,12 +526,7 @@ class VehicleClient:
 
         api_endpoint = f'{self.entry_point}driver?id={id}'
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='DELETE',
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('DELETE', api_endpoint)
 
     @exception_handler
     async def post_program(self, name)-> str:
@@ -172,13 +537,7 @@ class VehicleClient:
                             "description": "Test program",
                             "manager": "John"})
         
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='POST',
-                                        body=body,
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('POST', api_endpoint, body)
 
     @exception_handler
     async def put_program(self, id, name):
@@ -189,13 +548,7 @@ class VehicleClient:
                             "description": "Test program1000",
                             "manager": "John"})
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='PUT',
-                                        body=body,
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('PUT', api_endpoint, body)
 
     @exception_handler
     async def get_program(self, id)->object:
@@ -204,12 +557,7 @@ class VehicleClient:
         api_endpoint = f'{self.entry_point}program?org_name=lileesystems&id={id}'\
                         '&with_children_count=false&with_vehicle_count=false&with_full_path=false'
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='GET',
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('GET', api_endpoint)
 
     @exception_handler
     async def get_program_search(self, id)->list:
@@ -217,12 +565,7 @@ class VehicleClient:
 
         api_endpoint = f'{self.entry_point}program/search?org_name=lileesystems&id={id}'
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='GET',
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('GET', api_endpoint)
 
     @exception_handler
     async def get_program_list(self, id=None)-> list:
@@ -232,12 +575,7 @@ class VehicleClient:
                         '&with_vehicle_count=false&with_full_path=false&with_top=false'
         if id is not None:
             api_endpoint += f'&search_id={id}'
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='GET',
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('GET', api_endpoint)
 
     @exception_handler
     async def delete_program(self, id):
@@ -245,12 +583,7 @@ class VehicleClient:
 
         api_endpoint = f'{self.entry_point}program?id={id}'
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='DELETE',
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('DELETE', api_endpoint)
 
     @exception_handler
     async def post_item(self, name)-> (str, str):
@@ -265,31 +598,26 @@ class VehicleClient:
                             "kind": None,
                             "capacity": 4})
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='POST',
-                                        body=body,
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
-
-    @exception_handler
-    async def get_list(self, id=None, program_id=None)-> list:
-        """List vehicles by default filter."""
+        return await self.request('POST', api_endpoint, body)
 
+    def get_list_endpoint(self, id=None, program_id=None, offset=0, count=1000)->str:
         api_endpoint = f'{self.entry_point}list?org_name=lileesystems'\
                         '&with_program_info=false&with_program_path=false'\
                         '&with_device_info=false&without_no_device=false'\
-                        '&offset=0&count=1000'
+                        f'&offset={offset}&count={count}'
+        if id is not None:
+            api_endpoint += f'&search_id={id}'
         if program_id != None:
             api_endpoint += f'&program_id={program_id}'
+        return api_endpoint
+
+    @exception_handler
+    async def get_list(self, id=None, program_id=None, offset=0, count=1000)-> list:
+        """List vehicles by default filter."""
+
+        api_endpoint = self.get_list_endpoint(id, program_id, offset, count)
         
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='GET',
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('GET', api_endpoint)
 
     @exception_handler
     async def get_list_by_device(self, device_ids)-> list:
@@ -297,12 +625,7 @@ class VehicleClient:
 
         api_endpoint = f'{self.entry_point}list/by_device?org_name=lileesystems&device_ids={device_ids}&with_program_info=false&with_full_path=false&with_device_info=false'
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='GET',
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('GET', api_endpoint)
 
     @exception_handler
     async def put_program_link(self, id, program_id):
@@ -313,13 +636,7 @@ class VehicleClient:
         body = json.dumps({"program_id": program_id,
                             "vehicle_ids": [id]})
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='PUT',
-                                        body=body,
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('PUT', api_endpoint, body)
 
     @exception_handler
     async def put_item(self, vehicle_id, device_mac, name):
@@ -334,13 +651,7 @@ class VehicleClient:
                             "kind": None,
                             "capacity": 22})
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='PUT',
-                                        body=body,
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('PUT', api_endpoint, body)
 
     @exception_handler
     async def delete_item(self, id):
@@ -348,25 +659,21 @@ class VehicleClient:
 
         api_endpoint = f'{self.entry_point}item?id={id}'
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='DELETE',
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('DELETE', api_endpoint)
+
+    def get_device_list_endpoint(self, id=None, offset=0, count=1000)->str:
+        api_endpoint = f'{self.entry_point}device/list?org_name=lileesystems&offset={offset}&count={count}'
+        if id is not None:
+            api_endpoint += f'&search_id={id}'
+        return api_endpoint
 
     @exception_handler
-    async def get_device_list(self, id=None)-> list:
+    async def get_device_list(self, id=None, offset=0, count=1000)-> list:
         """List devices by default filter."""
 
-        api_endpoint = f'{self.entry_point}device/list?org_name=lileesystems&offset=0&count=1000'
+        api_endpoint = self.get_device_list_endpoint(id, offset, count)
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='GET',
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('GET', api_endpoint)
 
     @exception_handler
     async def get_event_list(self, start, end)->list:
@@ -374,47 +681,62 @@ class VehicleClient:
 
         api_endpoint = f'{self.entry_point}event/list?start_time={start}&end_time={end}'
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='GET',
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('GET', api_endpoint)
+
+    async def get_event_list_chunked(self, start, end, window=event_window)->dict:
+        """Get the event list of a long range as windows requested concurrently, merged in order."""
+
+        return await self.get_windows(self.get_event_list, split_range(start, end, window, inclusive=True))
+
+    def iter_event_list(self, start, end, window=event_window):
+        """Yield ((start, end), msg) for every window of the event list as it arrives."""
+
+        return self.iter_windows(self.get_event_list, split_range(start, end, window, inclusive=True))
 
     @exception_handler
-    async def get_telematic(self)->object:
+    async def get_telematic(self, id=telematic_vehicle_id, start=1585440000, end=1585499424,
+                            chart_granularity=86400, map_granularity=86400)->object:
         """Get telematic by default filter."""
 
-        api_endpoint = f'{self.entry_point}telematic?id=d9144f8d-3e0f-4df6-9a89-92aa7c0d36b8'\
-                        '&start_time=1585440000&end_time=1585499424&chart_granularity=86400'\
-                        '&map_granularity=86400'
+        api_endpoint = f'{self.entry_point}telematic?id={id}'\
+                        f'&start_time={start}&end_time={end}&chart_granularity={chart_granularity}'\
+                        f'&map_granularity={map_granularity}'
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='GET',
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('GET', api_endpoint)
+
+    def get_telematic_windows(self, start, end, chart_granularity, map_granularity, window)->list:
+        step = chart_granularity * map_granularity // math.gcd(chart_granularity, map_granularity)
+        return split_range(start, end, window, step)
+
+    async def get_telematic_chunked(self, id=telematic_vehicle_id, start=1585440000, end=1585499424,
+                                    chart_granularity=86400, map_granularity=86400,
+                                    window=telematic_window)->dict:
+        """Get the telematic of a long range as windows requested concurrently, merged in order."""
+
+        windows = self.get_telematic_windows(start, end, chart_granularity, map_granularity, window)
+        return await self.get_windows(lambda start, end: self.get_telematic(id, start, end,
+                                                                            chart_granularity,
+                                                                            map_granularity),
+                                      windows)
+
+    def iter_telematic(self, id=telematic_vehicle_id, start=1585440000, end=1585499424,
+                       chart_granularity=86400, map_granularity=86400, window=telematic_window):
+        """Yield ((start, end), msg) for every window of the telematic as it arrives."""
+
+        windows = self.get_telematic_windows(start, end, chart_granularity, map_granularity, window)
+        return self.iter_windows(lambda start, end: self.get_telematic(id, start, end,
+                                                                      chart_granularity,
+                                                                      map_granularity),
+                                 windows)
 
     @exception_handler
-    async def post_realtime(self)->object:
-        """Get real-time data by a default vehicle."""
+    async def post_realtime(self, vehicle_ids=None, fields=realtime_fields)->object:
+        """Get real-time data of the given vehicles, the default vehicle if none are given."""
 
         api_endpoint = f'{self.entry_point}realtime'
-        body = json.dumps({"vehicle_ids": [
-                            "d9144f8d-3e0f-4df6-9a89-92aa7c0d36b8"
-                            ],
-                            "fields": ["vin",
-                                        "is_engine_light_on",
-                                        "device_status",
-                                        "camera_info"]})
+        body = json.dumps({"vehicle_ids": list(vehicle_ids or [telematic_vehicle_id]),
+                            "fields": list(fields)})
 
-        async def fetch():
-            return await self.http_client.fetch(api_endpoint,
-                                        raise_error=False,
-                                        method='POST',
-                                        body=body,
-                                        headers=self.headers)
-        return await self.auth_promise_fetch(fetch)
+        return await self.request('POST', api_endpoint, body)
     
 